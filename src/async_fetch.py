@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import aiohttp
+
+from cache import create_zip_temporary_file, load_doc_list, load_zip_path, save_doc_list, save_zip_file
+from fetch import (
+    API_KEY,
+    BASE_URL,
+    BURST,
+    DOC_LIST_URL,
+    DOC_TYPE,
+    MAX_RETRIES,
+    REQUESTS_PER_SECOND,
+    RETRY_STATUS_CODES,
+    TIMEOUT,
+    get_backoff_time,
+    metrics,
+)
+from tracing import tracer
+
+# ZIPを読み込む単位(バイト)
+CHUNK_SIZE = 1024 * 1024
+CONCURRENCY = 16
+
+
+class AsyncTokenBucket:
+    # fetch.TokenBucketの非同期版。待機中もイベントループを止めない
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncEdinetClient:
+    # 1つの接続プールとセマフォを共有して、EDINET APIを非同期に呼び出す
+    # 同期版(fetch.py)とはレート制限を共有しないため、同時に使う場合はrateを分けて設定する
+    #   async with AsyncEdinetClient() as client:
+    #       doc_list = await client.fetch_doc_list("2023-11-30")
+    #       zip_path = await client.download_annual_report(doc_list["results"][0]["docID"])
+
+    def __init__(self, concurrency=CONCURRENCY, rate=REQUESTS_PER_SECOND, burst=BURST):
+        self.concurrency = concurrency
+        self.rate_limiter = AsyncTokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(sock_connect=TIMEOUT[0], sock_read=TIMEOUT[1]),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, url: str, params: dict, handle_response):
+        # fetch.request_with_retryと同じく、429、5xx、接続エラーの場合はバックオフして再試行し、最後まで失敗した場合は例外を送出する
+        # handle_response: レスポンスを受け取り、結果と読み込んだバイト数を返すコルーチン関数
+        assert self._session is not None, "async withの中で呼び出してください"
+        # requestsと同じく、値がNoneのパラメータは送らない
+        params = {key: value for key, value in params.items() if value is not None}
+        error: Exception | None = None
+        for attempt in range(MAX_RETRIES + 1):
+            await self.rate_limiter.acquire()
+            start = time.monotonic()
+            retry_after = None
+            try:
+                async with self._semaphore, self._session.get(url, params=params) as response:
+                    if response.status not in RETRY_STATUS_CODES:
+                        try:
+                            result, size = await handle_response(response)
+                        except (aiohttp.ClientError, asyncio.TimeoutError):
+                            # 読み込み中の接続エラーは下で再試行し、そこで数える
+                            raise
+                        except Exception:
+                            # 404など再試行しないステータスで処理に失敗した場合も、失敗として数える
+                            metrics.record(time.monotonic() - start, retry=attempt > 0, failure=True)
+                            raise
+                        metrics.record(time.monotonic() - start, size, retry=attempt > 0)
+                        return result
+                    retry_after = response.headers.get("Retry-After")
+                    error = aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status, message=str(response.reason)
+                    )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+            # 失敗回数は、再試行しても失敗したリクエストのみを数える
+            metrics.record(time.monotonic() - start, retry=attempt > 0, failure=attempt == MAX_RETRIES)
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(get_backoff_time(attempt, retry_after))
+        assert error is not None
+        raise error
+
+    async def fetch_doc_list(self, date: str, use_cache=True):
+        if " " in date:
+            date = date.split(" ")[0]
+        if use_cache:
+            cached = await asyncio.to_thread(load_doc_list, date)
+            if cached is not None:
+                return cached
+        doc_list_parameter = {
+            "date": date,
+            "type": 2,  # 提出書類を取得します。
+            "Subscription-Key": API_KEY,
+        }
+
+        async def handle_response(response: aiohttp.ClientResponse):
+            body = await response.read()
+            span["bytes"] = len(body)
+            return json.loads(body), len(body)
+
+        with tracer.stage("fetch.doc_list") as span:
+            result = await self._request(DOC_LIST_URL, doc_list_parameter, handle_response)
+        # エラー時のレスポンスにはresultsが含まれないため、キャッシュしない
+        if use_cache and "results" in result:
+            await asyncio.to_thread(save_doc_list, date, result)
+        return result
+
+    async def download_annual_report(self, doc_id: str, use_cache=True) -> str:
+        # ZIPはメモリに溜めずに一時ファイルへ書き込み、キャッシュに移動してそのパスを返す
+        # キャッシュしない場合、ZIPとして読めない場合は一時ファイルのパスを返す(削除は呼び出し元で行う)
+        if use_cache:
+            with tracer.stage("cache.load_zip"):
+                cached = await asyncio.to_thread(load_zip_path, doc_id)
+            if cached is not None:
+                return cached
+        doc_parameter = {"type": DOC_TYPE, "Subscription-Key": API_KEY}
+
+        async def handle_response(response: aiohttp.ClientResponse):
+            assert response.status == 200
+            temporary_path = await asyncio.to_thread(create_zip_temporary_file)
+            sha256 = hashlib.sha256()
+            size = 0
+            try:
+                with open(temporary_path, "wb") as file:
+                    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        # ディスクへの書き込みでイベントループを止めない
+                        await asyncio.to_thread(file.write, chunk)
+            except BaseException:
+                os.remove(temporary_path)
+                raise
+            span["bytes"] = size
+            return (temporary_path, sha256.hexdigest()), size
+
+        with tracer.stage("fetch.download_zip") as span:
+            temporary_path, sha256 = await self._request(f"{BASE_URL}/{doc_id}", doc_parameter, handle_response)
+        if not use_cache:
+            return temporary_path
+        return await asyncio.to_thread(save_zip_file, doc_id, temporary_path, sha256) or temporary_path
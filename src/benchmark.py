@@ -0,0 +1,327 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+import fetch
+from calculate import calculate_weighted_average_cost
+from file_utils import (
+    BASE_PATH,
+    ROW_CSV_HEADER,
+    csv_to_df,
+    export_df_to_csv,
+    extract_zip,
+    read_doc_from_zip,
+    save_intermediate,
+)
+from financial_data import FinancialDataProcessor
+from item_mapping import item_mapping
+from panel import FinancialPanelProcessor, concat_filings
+from preprocess import preprocess_csv, preprocess_zip, remove_unnecessary_columns
+from report import generate_report_from_zip
+
+BENCHMARK_PATH = os.path.join(BASE_PATH, "benchmark")
+# 記録済みのZIP({docID}.zip)を置くディレクトリ。record_fixturesで実際の書類を保存できる
+FIXTURE_PATH = os.path.join(BENCHMARK_PATH, "fixtures")
+# 比較の基準とする結果。計測する環境ごとに異なるため、リポジトリには含めない
+BASELINE_PATH = os.getenv("EDINET_BENCHMARK_BASELINE", os.path.join(BENCHMARK_PATH, "baseline.json"))
+# 基準よりこの割合以上遅い(メモリを使う)場合を劣化とする
+REGRESSION_THRESHOLD = 0.2
+REPEAT = 3
+SYNTHETIC_FILINGS = 20
+# 合成する書類1つあたりの、指標の計算に使わない行数(実際の有価証券報告書は数千行ある)
+SYNTHETIC_FILLER_ROWS = 3000
+ROW_COLUMNS = ["要素ID", "項目名", "コンテキストID", "相対年度", "連結・個別", "期間・時点", "ユニットID", "単位", "値"]
+# 相対年度 → コンテキストID
+TERMS = {
+    "前期": "Prior1YearDuration",
+    "当期": "CurrentYearDuration",
+    "前期末": "Prior1YearInstant",
+    "当期末": "CurrentYearInstant",
+}
+DEBT_DETAIL = (
+    "区分 当期首残高（百万円） 当期末残高（百万円） 平均利率（％） 返済期限 "
+    "短期借入金 {0:,} {1:,} 0.52 － １年以内に返済予定の長期借入金 {2:,} {3:,} 0.81 － "
+    "長期借入金（１年以内に返済予定のものを除く。） {4:,} {5:,} 0.95 2025年～2030年 合計 － － － －"
+)
+
+
+def make_synthetic_doc(seed: int, filler_rows=SYNTHETIC_FILLER_ROWS) -> pd.DataFrame:
+    # XBRL_TO_CSV/jpcrp*.csvと同じ列を持つ書類を作る。item_mappingの項目を連結・個別、各相対年度について含める
+    rng = random.Random(seed)
+    rows = []
+    for key, item in item_mapping.items.items():
+        element_ids = item.get("element_ids", [f"jpcrp_cor:{key}"])
+        for name in item.get("names", []):
+            for term, context in TERMS.items():
+                for category in ("連結", "個別"):
+                    value = str(rng.randint(1, 10**9)) if rng.random() < 0.9 else f"△{rng.randint(1, 10**6)}"
+                    rows.append([element_ids[0], name, context, term, category, "", "JPY", "円", value])
+    for term, context in TERMS.items():
+        for name in (
+            "法人税等",
+            "法人税等調整額",
+            "減価償却累計額、建物及び構築物",
+            "減価償却累計額、機械装置及び運搬具",
+        ):
+            rows.append(["jppfs_cor:x", name, context, term, "連結", "", "JPY", "円", str(rng.randint(1, 10**8))])
+    debt_detail = DEBT_DETAIL.format(*(rng.randint(1, 10**5) for _ in range(6)))
+    for name in ("借入金等明細表、連結財務諸表 [テキストブロック]", "借入金等明細表、財務諸表 [テキストブロック]"):
+        rows.append(["jppfs_cor:x", name, "CurrentYearDuration", "当期", "連結", "", "", "", debt_detail])
+    # 指標の計算に使わない行と、前処理で捨てられる大きなテキストブロック
+    for i in range(filler_rows):
+        if i % 100 == 0:
+            name, value = f"注記{i} [テキストブロック]", "あ" * 2000
+            rows.append([f"jpcrp_cor:TextBlock{i}", name, "FilingDateInstant", "提出日時点", "", "", "", "", value])
+        else:
+            term, context = rng.choice(list(TERMS.items()))
+            value = str(rng.randint(1, 10**6))
+            rows.append([f"jpcrp_cor:Filler{i}", f"その他の項目{i}", context, term, "その他", "", "JPY", "円", value])
+    return pd.DataFrame(rows, columns=ROW_COLUMNS)
+
+
+def make_zip(df: pd.DataFrame, doc_id: str) -> bytes:
+    # EDINET APIのtype=5(CSV)と同じ構成のZIPを作る
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        csv = df.to_csv(sep="\t", index=False)
+        suffix = f"{doc_id}-000_2023-03-31_01_2023-06-30.csv"
+        zip_ref.writestr(f"XBRL_TO_CSV/jpcrp030000-asr-001_{suffix}", csv.encode("utf-16"))
+        zip_ref.writestr(f"XBRL_TO_CSV/jpaud-aar-cn-001_{suffix}", "".encode("utf-16"))
+    return buffer.getvalue()
+
+
+def load_fixtures(path=FIXTURE_PATH, synthetic=SYNTHETIC_FILINGS) -> dict[str, bytes]:
+    # 記録済みのZIPと合成したZIPを docID → ZIP で返す
+    fixtures = {}
+    for zip_path in sorted(glob.glob(os.path.join(path, "*.zip"))):
+        with open(zip_path, "rb") as file:
+            fixtures[os.path.splitext(os.path.basename(zip_path))[0]] = file.read()
+    for i in range(synthetic):
+        doc_id = f"S{i:07d}"
+        fixtures[doc_id] = make_zip(make_synthetic_doc(i), doc_id)
+    return fixtures
+
+
+def record_fixtures(doc_ids: list[str], path=FIXTURE_PATH):
+    # 実際の書類をダウンロードし、ベンチマーク用に保存する
+    os.makedirs(path, exist_ok=True)
+    for doc_id in doc_ids:
+        with open(os.path.join(path, f"{doc_id}.zip"), "wb") as file:
+            file.write(fetch.fetch_annual_report_by_docid(doc_id))
+
+
+def _make_handler(fixtures: dict[str, bytes]) -> type[BaseHTTPRequestHandler]:
+    # EDINET APIの代わりに、書類一覧(documents.json)と書類(documents/{docID})を返す
+    results = [
+        {"docID": doc_id, "secCode": f"{1000 + i}0", "docTypeCode": "120", "csvFlag": "1"}
+        for i, doc_id in enumerate(fixtures)
+    ]
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.endswith(".json"):
+                date = parse_qs(url.query).get("date", [""])[0]
+                body = json.dumps({"metadata": {"parameter": {"date": date}}, "results": results}).encode()
+                content_type = "application/json"
+            else:
+                doc_id = url.path.rsplit("/", 1)[-1]
+                if doc_id not in fixtures:
+                    self.send_error(404)
+                    return
+                body = fixtures[doc_id]
+                content_type = "application/octet-stream"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+@contextlib.contextmanager
+def serve_fixtures(fixtures: dict[str, bytes]) -> Iterator[str]:
+    # ローカルにHTTPサーバーを立て、fetch.pyの接続先をそこに向ける(リクエスト数の制限も外す)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(fixtures))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v2/documents"
+    original = (fetch.BASE_URL, fetch.DOC_LIST_URL, fetch.rate_limiter)
+    fetch.BASE_URL, fetch.DOC_LIST_URL = base_url, base_url + ".json"
+    fetch.rate_limiter = fetch.TokenBucket(rate=1e9, capacity=1)
+    try:
+        yield base_url
+    finally:
+        fetch.BASE_URL, fetch.DOC_LIST_URL, fetch.rate_limiter = original
+        server.shutdown()
+        server.server_close()
+
+
+def measure(func: Callable, inputs: list, repeat=REPEAT, filings_per_input=1) -> dict:
+    # inputsの各要素についてfuncを実行し、1回あたりの時間、1秒あたりの書類数、最大メモリ使用量を返す
+    # メモリの計測(tracemalloc)は実行を遅くするため、時間の計測とは別に1回だけ行う
+    latencies = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            func(value)
+            latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for value in inputs:
+        func(value)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    latencies.sort()
+    return {
+        "latency_mean": statistics.mean(latencies),
+        "latency_p95": latencies[int(len(latencies) * 0.95)],
+        "filings_per_sec": len(latencies) * filings_per_input / sum(latencies),
+        "peak_memory": peak_memory,
+    }
+
+
+def run_benchmarks(fixtures: dict[str, bytes], repeat=REPEAT) -> dict[str, dict]:
+    # 取得 → 読み込み → 前処理 → 計算 → 出力の各段階と、全体を計測する
+    work_path = os.path.join(BENCHMARK_PATH, "work")
+    doc_ids = list(fixtures)
+    zips = list(fixtures.values())
+    # 各段階の入力を用意する
+    row_dfs = [read_doc_from_zip(zip_file) for zip_file in zips]
+    for doc_id, zip_file in fixtures.items():
+        extract_zip(zip_file, os.path.join("benchmark", "work", doc_id))
+    row_paths = [
+        save_intermediate(row_df, os.path.join("benchmark", "work", doc_id), ROW_CSV_HEADER, f"{doc_id}.csv", "csv")
+        for doc_id, row_df in zip(doc_ids, row_dfs)
+    ]
+    preprocessed_dfs = [remove_unnecessary_columns(row_df) for row_df in row_dfs]
+    reports = [FinancialDataProcessor(df, 2023).get_report() for df in preprocessed_dfs]
+    debt_details = [
+        FinancialDataProcessor(df, 2023)._get_first_value_by_name("consolidated_debt_detail", "当期")
+        for df in preprocessed_dfs
+    ]
+    panel_keys = ["docID", "year"]
+    panel_df = concat_filings([(doc_id, 2023, df) for doc_id, df in zip(doc_ids, preprocessed_dfs)], panel_keys)
+    export_path = os.path.join(work_path, "report.csv")
+
+    results = {}
+    # 計測対象の関数が出力するログは表示しない
+    with contextlib.redirect_stdout(io.StringIO()):
+        with serve_fixtures(fixtures):
+            results["fetch_doc_list"] = measure(
+                lambda date: fetch.fetch_doc_list(date, use_cache=False), ["2023-06-30"], repeat
+            )
+            results["fetch_zip"] = measure(
+                lambda doc_id: fetch.fetch_annual_report_by_docid(doc_id, use_cache=False), doc_ids, repeat
+            )
+        results["read_doc_from_zip"] = measure(read_doc_from_zip, zips, repeat)
+        results["csv_to_df"] = measure(
+            lambda doc_id: csv_to_df(os.path.join("benchmark", "work", doc_id)), doc_ids, repeat
+        )
+        results["preprocess_csv"] = measure(preprocess_csv, row_paths, repeat)
+        results["preprocess_zip"] = measure(preprocess_zip, zips, repeat)
+        results["get_report"] = measure(
+            lambda df: FinancialDataProcessor(df, 2023).get_report(), preprocessed_dfs, repeat
+        )
+        results["panel_get_report"] = measure(
+            lambda df: FinancialPanelProcessor(df, panel_keys).get_report(),
+            [panel_df],
+            repeat,
+            filings_per_input=len(doc_ids),
+        )
+        results["calculate_weighted_average_cost"] = measure(calculate_weighted_average_cost, debt_details, repeat)
+        results["export_df_to_csv"] = measure(lambda report: export_df_to_csv(report, export_path), reports, repeat)
+        results["end_to_end"] = measure(
+            lambda doc_id: generate_report_from_zip(
+                fixtures[doc_id], os.path.join("benchmark", "work", doc_id), f"{doc_id}.csv", "2023", "none"
+            ),
+            doc_ids,
+            repeat,
+        )
+    shutil.rmtree(work_path, ignore_errors=True)
+    return results
+
+
+def load_baseline(path=BASELINE_PATH) -> dict[str, dict] | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(results: dict[str, dict], path=BASELINE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+
+def find_regressions(
+    results: dict[str, dict], baseline: dict[str, dict], threshold=REGRESSION_THRESHOLD
+) -> list[tuple[str, str, float, float]]:
+    # 基準より(1 + threshold)倍以上、遅くなった・メモリを使うようになった段階を返す
+    regressions = []
+    for stage, result in results.items():
+        if stage not in baseline:
+            continue
+        for metric in ("latency_mean", "peak_memory"):
+            if result[metric] > baseline[stage][metric] * (1 + threshold):
+                regressions.append((stage, metric, baseline[stage][metric], result[metric]))
+    return regressions
+
+
+def print_results(results: dict[str, dict], baseline: dict[str, dict] | None = None):
+    print(f"{'stage':<34}{'mean(ms)':>10}{'p95(ms)':>10}{'filings/s':>11}{'peak(MB)':>10}{'vs base':>9}")
+    for stage, result in results.items():
+        change = ""
+        if baseline is not None and stage in baseline:
+            change = f"{(result['latency_mean'] / baseline[stage]['latency_mean'] - 1) * 100:+.0f}%"
+        print(
+            f"{stage:<34}{result['latency_mean'] * 1000:>10.2f}{result['latency_p95'] * 1000:>10.2f}"
+            f"{result['filings_per_sec']:>11.1f}{result['peak_memory'] / 2**20:>10.2f}{change:>9}"
+        )
+
+
+if __name__ == "__main__":
+    # python benchmark.py [--save-baseline] [--record docID ...]
+    # 基準と比べて劣化した段階がある場合は終了コード1で終わる
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURE_PATH)
+    parser.add_argument("--synthetic", type=int, default=SYNTHETIC_FILINGS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--record", nargs="*", default=[])
+    args = parser.parse_args()
+    if args.record:
+        record_fixtures(args.record, args.fixtures)
+    results = run_benchmarks(load_fixtures(args.fixtures, args.synthetic), args.repeat)
+    baseline = load_baseline(args.baseline)
+    print_results(results, baseline)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    elif baseline is not None:
+        regressions = find_regressions(results, baseline, args.threshold)
+        for stage, metric, before, after in regressions:
+            print(f"Regression: {stage} {metric} {before:.4g} -> {after:.4g}")
+        sys.exit(1 if regressions else 0)
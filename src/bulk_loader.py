@@ -0,0 +1,132 @@
+import argparse
+import glob
+import os
+from concurrent.futures import as_completed
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cache import list_cached_zips
+from file_utils import CATEGORICAL_COLUMNS, read_doc_from_zip, write_intermediate
+from period import DEI_FISCAL_YEAR_END, DEI_SEC_CODE, get_dei_value, get_period_type
+from pipeline import create_process_pool
+from preprocess import preprocess_zip
+from tracing import tracer
+
+# 1つのプロセスにまとめて渡すZIPの数(ファイルの読み込みもプロセス内で行う)
+BULK_CHUNK_SIZE = 16
+# 書類を識別する列。CATEGORICAL_COLUMNSと合わせてカテゴリ型にする
+FILING_COLUMNS = ["docID", "secCode", "year", "period"]
+BULK_CATEGORICAL_COLUMNS = ["docID", "secCode", "period", *CATEGORICAL_COLUMNS]
+
+
+def find_zip_files(directory: str | None = None) -> list[tuple[str, str]]:
+    # (docID, ZIPのパス)のリスト。directoryを指定しない場合はZIPのキャッシュ、指定した場合は{docID}.zipを探す
+    if directory is None:
+        return list_cached_zips()
+    paths = sorted(glob.glob(os.path.join(directory, "*.zip")))
+    return [(os.path.splitext(os.path.basename(path))[0], path) for path in paths]
+
+
+def _load_filing(doc_id: str, path: str, preprocess: bool) -> pd.DataFrame:
+    with open(path, "rb") as file:
+        zip_data = file.read()
+    # preprocessの場合は必要な列・行だけを少しずつ読み込む
+    df = preprocess_zip(zip_data) if preprocess else read_doc_from_zip(zip_data)
+    # 証券コード・事業年度・当会計期間の種類は書類一覧ではなくDEIから取る(キャッシュのZIPだけで完結させるため)
+    fiscal_year_end = get_dei_value(df, DEI_FISCAL_YEAR_END)
+    year = int(fiscal_year_end[:4]) if fiscal_year_end is not None and fiscal_year_end[:4].isdigit() else None
+    filing = {
+        "docID": doc_id,
+        "secCode": get_dei_value(df, DEI_SEC_CODE),
+        "year": year,
+        "period": get_period_type(df),
+    }
+    return df.assign(**filing)[FILING_COLUMNS + [column for column in df.columns if column not in FILING_COLUMNS]]
+
+
+def _load_chunk(
+    chunk: list[tuple[int, str, str]], preprocess: bool
+) -> tuple[list[tuple[int, object]], dict[str, dict]]:
+    # プロセスプールで実行する。書類ごとにカテゴリ型に変換してから返し、親プロセスへ渡すデータを小さくする
+    # 読み込めなかった書類は例外を結果として返し、他の書類の読み込みを続ける
+    tracer.reset()
+    results: list[tuple[int, object]] = []
+    for index, doc_id, path in chunk:
+        try:
+            df = _load_filing(doc_id, path, preprocess)
+            results.append((index, df.astype({column: "category" for column in _categorical_columns(df)})))
+        except Exception as e:
+            results.append((index, e))
+    return results, tracer.snapshot()
+
+
+def _categorical_columns(df: pd.DataFrame) -> list[str]:
+    return [column for column in BULK_CATEGORICAL_COLUMNS if column in df.columns]
+
+
+def _concat_categorical(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    # 書類ごとにカテゴリが異なるため、pd.concatでは文字列に戻ってしまう。カテゴリの和集合で結合する
+    columns = _categorical_columns(frames[0])
+    df = pd.concat([frame.drop(columns=columns) for frame in frames], ignore_index=True)
+    for column in columns:
+        # 値がすべて欠損の書類(DEIのない書類のsecCodeなど)は、カテゴリの型が異なるため文字列に揃える
+        values = [frame[column].cat.set_categories(frame[column].cat.categories.astype(str)) for frame in frames]
+        df[column] = union_categoricals(values, ignore_order=True)
+    return df[frames[0].columns]
+
+
+def load_filings(
+    directory: str | None = None,
+    doc_ids=None,
+    preprocess=True,
+    max_workers=None,
+    chunk_size=BULK_CHUNK_SIZE,
+) -> pd.DataFrame:
+    # キャッシュ済み(またはdirectoryにある)ZIPのjpcrp*.csvを並列に読み込み、1つの縦持ちのデータにまとめる
+    # 列はdocID, secCode, year, period と、前処理済み(preprocess=Falseの場合は元のCSV)の列
+    # ダウンロードは行わないため、読み込みの速さはディスクとCPUの数で決まる
+    files = find_zip_files(directory)
+    if doc_ids is not None:
+        doc_ids = set(doc_ids)
+        files = [(doc_id, path) for doc_id, path in files if doc_id in doc_ids]
+    print(f"{len(files)}件のZIPを読み込みます。")
+    tasks = [(index, doc_id, path) for index, (doc_id, path) in enumerate(files)]
+    frames: dict[int, pd.DataFrame] = {}
+    with create_process_pool(max_workers) as executor:
+        futures = [
+            executor.submit(_load_chunk, tasks[start : start + chunk_size], preprocess)
+            for start in range(0, len(tasks), chunk_size)
+        ]
+        for future in as_completed(futures):
+            results, stages = future.result()
+            tracer.merge(stages)
+            for index, result in results:
+                if isinstance(result, Exception):
+                    print(f"docID: {files[index][0]} の読み込みに失敗しました。{result!r}")
+                else:
+                    frames[index] = result
+    if len(frames) == 0:
+        return pd.DataFrame(columns=FILING_COLUMNS)
+    # 結果の順番は完了順によらず、ZIPの一覧の順番にする
+    df = _concat_categorical([frames[index] for index in sorted(frames)])
+    df["year"] = df["year"].astype("Int64")
+    return df
+
+
+def build_snapshot(save_path: str, **kwargs) -> str:
+    # load_filingsの結果を、拡張子(.parquet, .feather)に応じた形式で保存する
+    write_intermediate(load_filings(**kwargs), save_path)
+    return save_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("save_path")
+    parser.add_argument("--directory", default=None)
+    parser.add_argument("--raw", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    build_snapshot(args.save_path, directory=args.directory, preprocess=not args.raw, max_workers=args.workers)
+    print(f"Saved snapshot to {args.save_path}")
+    tracer.print_summary()
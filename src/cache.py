@@ -0,0 +1,294 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import date as Date
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from file_utils import BASE_PATH
+
+CACHE_PATH = os.path.join(BASE_PATH, "cache")
+DOC_LIST_DB_PATH = os.path.join(CACHE_PATH, "doc_list.sqlite3")
+ZIP_CACHE_PATH = os.path.join(CACHE_PATH, "zip")
+ZIP_CACHE_DB_PATH = os.path.join(CACHE_PATH, "zip.sqlite3")
+# ZIPキャッシュの上限サイズ(バイト)。超えた場合は最後に使われた日時が古いものから削除する
+ZIP_CACHE_MAX_BYTES = int(os.getenv("EDINET_ZIP_CACHE_MAX_BYTES", 50 * 1024**3))
+# 当日分の書類一覧は提出が続くため、この秒数を過ぎたら再取得する
+DOC_LIST_TTL = 600
+# 書類一覧の日付は日本時間
+EDINET_TIMEZONE = ZoneInfo("Asia/Tokyo")
+# 書類一覧のうち、検索に使う列
+DOC_LIST_COLUMNS = (
+    "docID",
+    "edinetCode",
+    "secCode",
+    "docTypeCode",
+    "periodStart",
+    "periodEnd",
+    "submitDateTime",
+    "filerName",
+)
+if not os.path.exists(ZIP_CACHE_PATH):
+    os.makedirs(ZIP_CACHE_PATH)
+
+
+@contextmanager
+def _connect(path: str, schema: str):
+    # 呼び出しごとに接続を作成する(sqlite3の接続はスレッド間で共有できないため)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(schema)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def _connect_doc_list_db():
+    columns = ", ".join(f"{column} TEXT" for column in DOC_LIST_COLUMNS)
+    schema = f"""
+        CREATE TABLE IF NOT EXISTS fetched_dates (date TEXT PRIMARY KEY, fetched_at REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS documents (
+            date TEXT NOT NULL, seqNumber INTEGER NOT NULL, {columns}, data TEXT NOT NULL,
+            PRIMARY KEY (date, seqNumber)
+        );
+        CREATE INDEX IF NOT EXISTS documents_secCode ON documents (secCode, docTypeCode);
+        CREATE INDEX IF NOT EXISTS documents_edinetCode ON documents (edinetCode, docTypeCode);
+        CREATE INDEX IF NOT EXISTS documents_docTypeCode ON documents (docTypeCode);
+        """
+    return _connect(DOC_LIST_DB_PATH, schema)
+
+
+def _connect_zip_db():
+    schema = """
+        CREATE TABLE IF NOT EXISTS zip_files (
+            docID TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS zip_files_sha256 ON zip_files (sha256);
+        CREATE INDEX IF NOT EXISTS zip_files_last_access ON zip_files (last_access);
+        CREATE TABLE IF NOT EXISTS debt_tables (docID TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL);
+        """
+    return _connect(ZIP_CACHE_DB_PATH, schema)
+
+
+def edinet_today() -> Date:
+    # 実行環境のタイムゾーンによらず、日本時間の今日
+    return datetime.now(EDINET_TIMEZONE).date()
+
+
+def _is_immutable(date: str, fetched_at: float) -> bool:
+    # 対象日の翌日(日本時間)以降に取得した一覧は変更されない
+    return datetime.fromtimestamp(fetched_at, EDINET_TIMEZONE).date() > Date.fromisoformat(date)
+
+
+def _is_fresh(date: str, fetched_at: float) -> bool:
+    if _is_immutable(date, fetched_at):
+        return True
+    return time.time() - fetched_at < DOC_LIST_TTL
+
+
+def load_doc_list(date: str) -> dict | None:
+    # キャッシュ済みの書類一覧をfetch_doc_listと同じ形式で返す。ない場合、期限切れの場合はNone
+    with _connect_doc_list_db() as connection:
+        fetched = connection.execute("SELECT fetched_at FROM fetched_dates WHERE date = ?", (date,)).fetchone()
+        if fetched is None or not _is_fresh(date, fetched["fetched_at"]):
+            return None
+        rows = connection.execute("SELECT data FROM documents WHERE date = ? ORDER BY seqNumber", (date,))
+        return {"results": [json.loads(row["data"]) for row in rows]}
+
+
+def get_cached_dates() -> set[str]:
+    # 取得済みで、今後変更されない書類一覧の日付を返す
+    with _connect_doc_list_db() as connection:
+        rows = connection.execute("SELECT date, fetched_at FROM fetched_dates").fetchall()
+    return {row["date"] for row in rows if _is_immutable(row["date"], row["fetched_at"])}
+
+
+def save_doc_list(date: str, doc_list: dict):
+    results = doc_list["results"]
+    placeholders = ", ".join("?" * (len(DOC_LIST_COLUMNS) + 3))
+    records = [
+        (date, index, *(result.get(column) for column in DOC_LIST_COLUMNS), json.dumps(result, ensure_ascii=False))
+        for index, result in enumerate(results)
+    ]
+    with _connect_doc_list_db() as connection:
+        connection.execute("DELETE FROM documents WHERE date = ?", (date,))
+        connection.executemany(
+            f"INSERT INTO documents (date, seqNumber, {', '.join(DOC_LIST_COLUMNS)}, data) VALUES ({placeholders})",
+            records,
+        )
+        connection.execute("INSERT OR REPLACE INTO fetched_dates VALUES (?, ?)", (date, time.time()))
+
+
+def search_cached_documents(sec_code=None, edinet_code=None, doc_type_code=None, period_end_year=None) -> list[dict]:
+    # キャッシュ済みの書類一覧から、証券コード・EDINETコード・書類種別コード・期末日の年で検索する
+    # doc_type_codeはリストで複数指定できる
+    conditions = []
+    parameters: list[str] = []
+    for column, value in (("secCode", sec_code), ("edinetCode", edinet_code), ("docTypeCode", doc_type_code)):
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(f"{column} IN ({', '.join('?' * len(value))})")
+            parameters.extend(str(x) for x in value)
+        elif value is not None:
+            conditions.append(f"{column} = ?")
+            parameters.append(str(value))
+    if period_end_year is not None:
+        conditions.append("periodEnd LIKE ?")
+        parameters.append(f"{period_end_year}-%")
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    with _connect_doc_list_db() as connection:
+        rows = connection.execute(f"SELECT data FROM documents{where} ORDER BY date, seqNumber", parameters)
+        return [json.loads(row["data"]) for row in rows]
+
+
+def _zip_blob_path(sha256: str) -> str:
+    return os.path.join(ZIP_CACHE_PATH, sha256 + ".zip")
+
+
+def _remove_zip_entry(connection: sqlite3.Connection, doc_id: str, sha256: str):
+    connection.execute("DELETE FROM zip_files WHERE docID = ?", (doc_id,))
+    # 同じ内容のZIPを参照するdocIDが残っていなければ、実体も削除する
+    if connection.execute("SELECT 1 FROM zip_files WHERE sha256 = ?", (sha256,)).fetchone() is None:
+        if os.path.exists(_zip_blob_path(sha256)):
+            os.remove(_zip_blob_path(sha256))
+
+
+def load_zip(doc_id: str) -> bytes | None:
+    # docIDに対応するZIPを返す。ない場合、内容が壊れている場合はNone
+    with _connect_zip_db() as connection:
+        entry = connection.execute("SELECT sha256 FROM zip_files WHERE docID = ?", (doc_id,)).fetchone()
+        if entry is None:
+            return None
+        sha256 = entry["sha256"]
+        try:
+            with open(_zip_blob_path(sha256), "rb") as file:
+                zip_data = file.read()
+        except FileNotFoundError:
+            zip_data = None
+        if zip_data is None or hashlib.sha256(zip_data).hexdigest() != sha256:
+            print(f"docID: {doc_id} のキャッシュが壊れているため削除します。")
+            _remove_zip_entry(connection, doc_id, sha256)
+            return None
+        connection.execute("UPDATE zip_files SET last_access = ? WHERE docID = ?", (time.time(), doc_id))
+        return zip_data
+
+
+def load_zip_path(doc_id: str) -> str | None:
+    # load_zipと同じく内容を確かめ、ZIPをメモリに読み込まずにファイルのパスを返す
+    with _connect_zip_db() as connection:
+        entry = connection.execute("SELECT sha256 FROM zip_files WHERE docID = ?", (doc_id,)).fetchone()
+        if entry is None:
+            return None
+        sha256 = entry["sha256"]
+        path = _zip_blob_path(sha256)
+        try:
+            digest = _file_sha256(path)
+        except FileNotFoundError:
+            digest = None
+        if digest != sha256:
+            print(f"docID: {doc_id} のキャッシュが壊れているため削除します。")
+            _remove_zip_entry(connection, doc_id, sha256)
+            return None
+        connection.execute("UPDATE zip_files SET last_access = ? WHERE docID = ?", (time.time(), doc_id))
+        return path
+
+
+def _file_sha256(path: str, chunk_size=1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def list_cached_zips() -> list[tuple[str, str]]:
+    # キャッシュ済みのZIPの(docID, ファイルのパス)を返す。実体のないものは除く
+    with _connect_zip_db() as connection:
+        rows = connection.execute("SELECT docID, sha256 FROM zip_files ORDER BY docID").fetchall()
+    paths = [(row["docID"], _zip_blob_path(row["sha256"])) for row in rows]
+    return [(doc_id, path) for doc_id, path in paths if os.path.exists(path)]
+
+
+def save_zip(doc_id: str, zip_data: bytes):
+    # 提出済みの書類は変更されないため、ZIPとして読めるものだけをdocIDごとに保存する
+    if not zipfile.is_zipfile(io.BytesIO(zip_data)):
+        return
+    sha256 = hashlib.sha256(zip_data).hexdigest()
+    if not os.path.exists(_zip_blob_path(sha256)):
+        # 書き込み途中のファイルが読まれないよう、一時ファイルに書いてから置き換える
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=ZIP_CACHE_PATH, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(zip_data)
+        os.replace(temporary_path, _zip_blob_path(sha256))
+    _register_zip(doc_id, sha256, len(zip_data))
+
+
+def create_zip_temporary_file() -> str:
+    # ダウンロード中のZIPを書き込む一時ファイルを、キャッシュと同じディレクトリに作成する
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=ZIP_CACHE_PATH, suffix=".tmp")
+    os.close(file_descriptor)
+    return temporary_path
+
+
+def save_zip_file(doc_id: str, temporary_path: str, sha256: str) -> str | None:
+    # create_zip_temporary_fileに書き込んだZIPをキャッシュに移動し、保存先のパスを返す
+    # ZIPとして読めない場合は何もせずにNoneを返す(一時ファイルの削除は呼び出し元で行う)
+    if not zipfile.is_zipfile(temporary_path):
+        return None
+    size = os.path.getsize(temporary_path)
+    path = _zip_blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(temporary_path)
+    else:
+        os.replace(temporary_path, path)
+    _register_zip(doc_id, sha256, size)
+    return path
+
+
+def _register_zip(doc_id: str, sha256: str, size: int):
+    with _connect_zip_db() as connection:
+        connection.execute("INSERT OR REPLACE INTO zip_files VALUES (?, ?, ?, ?)", (doc_id, sha256, size, time.time()))
+        _evict_zip(connection, keep_doc_id=doc_id)
+
+
+def _evict_zip(connection: sqlite3.Connection, keep_doc_id: str | None = None):
+    # keep_doc_idのZIP(保存した直後のもの)は、上限を超える場合も削除しない(返したパスが消えないように)
+    # 同じ内容のZIPは1つだけ保存されるため、sha256ごとにサイズを数える
+    total_size = connection.execute(
+        "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM zip_files)"
+    ).fetchone()[0]
+    if total_size <= ZIP_CACHE_MAX_BYTES:
+        return
+    entries = connection.execute("SELECT docID, sha256, size FROM zip_files ORDER BY last_access").fetchall()
+    for entry in entries:
+        if total_size <= ZIP_CACHE_MAX_BYTES:
+            break
+        if entry["docID"] == keep_doc_id:
+            continue
+        _remove_zip_entry(connection, entry["docID"], entry["sha256"])
+        if not os.path.exists(_zip_blob_path(entry["sha256"])):
+            total_size -= entry["size"]
+
+
+def load_debt_table(doc_id: str, version: int) -> dict | None:
+    # 解析済みの借入金等明細表を返す。ない場合、解析方法(version)が異なる場合はNone
+    with _connect_zip_db() as connection:
+        entry = connection.execute("SELECT version, data FROM debt_tables WHERE docID = ?", (doc_id,)).fetchone()
+    if entry is None or entry["version"] != version:
+        return None
+    return json.loads(entry["data"])
+
+
+def save_debt_table(doc_id: str, version: int, table: dict):
+    with _connect_zip_db() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO debt_tables VALUES (?, ?, ?)",
+            (doc_id, version, json.dumps(table, ensure_ascii=False)),
+        )
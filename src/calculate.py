@@ -1,25 +1,38 @@
-import re
+import numpy as np
 
+from debt_table import get_debt_table, weighted_average_rate
 
-def calculate_growth_ratio(previous: float, current: float) -> str:
-    if previous == 0 or current == 0:
-        return "0%"
-    result = (current - previous) / previous * 100
-    return str(round(result, 2)) + "%"
+# 比率の計算は、スカラー・NumPy配列・pandas.Seriesのいずれも受け取り、同じ形で返す
+# 分母が0の場合、値がない(NaN)場合はNaNとし、丸め・"%"の書式は出力時(utils.format_percentage)に行う
 
 
-def calculate_str_ratio(a: float, b: float, decimal=2) -> str:
-    if a == 0 or b == 0:
-        return "0%"
-    result = a / b * 100
-    return str(round(result, decimal)) + "%"
+def _to_nan_where(values, condition):
+    if hasattr(values, "where"):
+        # 分母がスカラーの場合など、conditionがSeriesでない場合はvaluesの形に揃える
+        if not hasattr(condition, "index"):
+            condition = np.broadcast_to(condition, np.shape(values))
+        return values.where(~condition)
+    values = np.where(condition, np.nan, values)
+    return float(values) if np.ndim(values) == 0 else values
 
 
-def calculate_ratio(a: float, b: float, decimal=2) -> float:
-    if a == 0 or b == 0:
-        return 0.0
-    result = a / b
-    return round(result, decimal)
+def calculate_ratio(a, b, decimal=None):
+    # a / b。decimalを指定した場合は丸める(実効税率など、計算に使う値を丸める場合)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.true_divide(a, b)
+    if decimal is not None:
+        result = np.round(result, decimal)
+    return _to_nan_where(result, np.equal(b, 0))
+
+
+def calculate_percentage(a, b):
+    # a / b を%で返す(例: 売上高に対する営業利益の比率)
+    return calculate_ratio(a, b) * 100
+
+
+def calculate_growth_ratio(previous, current):
+    # previousからcurrentへの増加率(%)
+    return calculate_percentage(np.subtract(current, previous), previous)
 
 
 # 投下資本の計算
@@ -34,30 +47,13 @@ def calculate_invested_capital(
     return (last_invested_capital + current_invested_capital) / 2
 
 
-def calculate_weighted_average_cost(text_data):
-    # 該当事項がない場合のチェック
-    if text_data == "" or "該当事項はありません" in text_data:
-        return 0  # 借入金等の情報がないため、加重平均借入コストは0
-
-    # パターンを使用して借入金の詳細を抽出（小数点、カンマ、ダッシュに対応）
-    pattern = r"([\D]+?)(\d{1,3}(?:,\d{3})*|\－)\s*(\d{1,3}(?:,\d{3})*|\－)\s*(\d+\.\d+|\－)"
-    matches = re.findall(pattern, text_data)
-
-    # 各借入金類の情報を処理
-    total_weighted_rate = 0
-    total_balance = 0
-
-    for match in matches:
-        description, start_balance, end_balance, rate = match
-        if end_balance == "－" or rate == "－":
-            continue  # データが存在しない場合はスキップ
-
-        end_balance = int(end_balance.replace(",", ""))  # カンマを除去し整数に変換
-        rate = float(rate)  # 文字列を浮動小数点数に変換
+# 直近12か月(TTM)の値の計算
+# 前年度の通期の値に、当年度の期首からの累計を足し、前年度の同じ期間の累計を引く
+def calculate_ttm(previous_annual: float, current_cumulative: float, previous_cumulative: float) -> float:
+    return previous_annual + current_cumulative - previous_cumulative
 
-        total_weighted_rate += end_balance * rate
-        total_balance += end_balance
 
-    # 全体の加重平均借入コストを計算
-    weighted_average_cost = total_weighted_rate / total_balance if total_balance else 0
-    return weighted_average_cost
+def calculate_weighted_average_cost(text_data, doc_id: str | None = None):
+    # 借入金等明細表 [テキストブロック]から、当期末残高で重み付けした平均利率を計算する
+    # 該当事項がない場合、借入金の行がない場合は0。doc_idを指定した場合は解析結果をキャッシュする
+    return weighted_average_rate(get_debt_table(text_data, doc_id))
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date as Date
+from datetime import timedelta
+
+import pandas as pd
+
+from cache import edinet_today, get_cached_dates, search_cached_documents
+from fetch import fetch_doc_list
+from type import ReportType
+from utils import normalize_sec_code
+
+# 有価証券報告書は期末日から3か月以内に提出されるため、期末日の年の翌年6月末までを探す
+ANNUAL_REPORT_SUBMISSION_MONTHS = 6
+
+
+def get_dates(start_date: str, end_date: str) -> list[str]:
+    # start_dateからend_date(日本時間の今日より後の場合は今日)までの日付をYYYY-MM-DD形式で返す
+    start = Date.fromisoformat(start_date)
+    end = min(Date.fromisoformat(end_date), edinet_today())
+    return [str(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+
+
+def crawl_doc_lists(start_date: str, end_date: str, max_workers=4) -> list[str]:
+    # 期間内の書類一覧を並列に取得してキャッシュに保存し、取得に失敗した日付を返す
+    # 取得済みの日付は飛ばすため、途中で止めても続きから再開できる
+    cached_dates = get_cached_dates()
+    dates = [date for date in get_dates(start_date, end_date) if date not in cached_dates]
+    print(f"{len(dates)}日分の書類一覧を取得します。")
+    failed_dates = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_doc_list, date): date for date in dates}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"{futures[future]} の書類一覧の取得に失敗しました。{e!r}")
+                failed_dates.append(futures[future])
+                continue
+            if "results" not in result:
+                print(f"{futures[future]} の書類一覧の取得に失敗しました。{result}")
+                failed_dates.append(futures[future])
+    return sorted(failed_dates)
+
+
+def find_filings(
+    sec_code=None,
+    edinet_code=None,
+    doc_type_codes=(ReportType.ANNUAL_SECURITIES_REPORT.value,),
+    fiscal_year=None,
+) -> pd.DataFrame:
+    # キャッシュ済みの書類一覧から書類を探す。fiscal_yearは期末日(periodEnd)の年
+    sec_code = normalize_sec_code(sec_code) if sec_code is not None else None
+    docs = search_cached_documents(sec_code, edinet_code, list(doc_type_codes), fiscal_year)
+    if len(docs) == 0:
+        return pd.DataFrame(columns=["docID", "secCode", "edinetCode", "docTypeCode", "periodEnd", "submitDateTime"])
+    return pd.DataFrame(docs).sort_values(by="submitDateTime", ignore_index=True)
+
+
+def find_annual_report(sec_code: str, fiscal_year: int, max_workers=4) -> pd.DataFrame:
+    # 証券コードと年度から有価証券報告書を探す。見つからない場合は提出されうる期間の書類一覧を取得して探し直す
+    df = find_filings(sec_code, fiscal_year=fiscal_year)
+    if len(df) == 0:
+        end_date = f"{fiscal_year + 1}-{ANNUAL_REPORT_SUBMISSION_MONTHS:02d}-30"
+        crawl_doc_lists(f"{fiscal_year}-01-01", end_date, max_workers)
+        df = find_filings(sec_code, fiscal_year=fiscal_year)
+    assert len(df) > 0, f"{sec_code}の{fiscal_year}年度の有価証券報告書が見つかりませんでした。"
+    # 同じ年度に複数ある場合は、最後に提出されたものを返す
+    return df.tail(1).reset_index(drop=True)
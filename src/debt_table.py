@@ -0,0 +1,134 @@
+import html
+import logging
+import re
+import unicodedata
+
+from cache import load_debt_table, save_debt_table
+
+# 解析結果の形式・解析方法を変えた場合は上げる(古いキャッシュは使わない)
+DEBT_TABLE_PARSER_VERSION = 2
+NOT_APPLICABLE = "該当事項はありません"
+# 値がないことを表すダッシュ(全角・半角、罫線など)。文字クラスに埋め込むため"-"は最後に置く
+DASHES = "‐－―—–-"
+_HTML_TAG = re.compile(r"<[^>]*>")
+# 数値(3桁区切り、小数、%)、ダッシュ、それ以外の文字列に分ける(バックトラックしない)
+_TOKEN = re.compile(rf"\d[\d,]*(?:\.\d+)?%?|[{DASHES}]+|[^\s\d{DASHES}]+")
+_AMOUNT = re.compile(r"\d{1,3}(?:,\d{3})+|\d+")
+_RATE = re.compile(r"\d+\.\d+%?")
+# 平均利率の後に続く返済期限(2025年~2030年など)
+_REPAYMENT_TERM = re.compile(r"[年月日~〜、.]+")
+# 表の見出しの最後の列
+HEADER_END = "返済期限"
+# 金額の単位 → 円への倍率
+UNITS = {"百万円": 1_000_000, "千円": 1_000, "円": 1}
+
+
+def _normalize(text: str) -> str:
+    # HTMLのタグ・文字参照を除き、全角の数字・記号を半角にする(全角のダッシュは"-"になる)
+    text = html.unescape(_HTML_TAG.sub(" ", text))
+    return unicodedata.normalize("NFKC", text)
+
+
+def _is_missing(token: str) -> bool:
+    return all(character in DASHES for character in token)
+
+
+def _is_amount(token: str) -> bool:
+    return _is_missing(token) or _AMOUNT.fullmatch(token) is not None
+
+
+def _is_rate(token: str) -> bool:
+    return _is_missing(token) or _RATE.fullmatch(token) is not None
+
+
+def _is_label_number(tokens: list[str], i: int) -> bool:
+    # 区分の先頭の数字(１年以内など)。数字の直後に、返済期限ではない区分の文字が続く
+    return (
+        _AMOUNT.fullmatch(tokens[i]) is not None
+        and i + 1 < len(tokens)
+        and not _is_amount(tokens[i + 1])
+        and _REPAYMENT_TERM.fullmatch(tokens[i + 1]) is None
+    )
+
+
+def _to_number(token: str) -> float | None:
+    if _is_missing(token):
+        return None
+    return float(token.replace(",", "").rstrip("%"))
+
+
+def parse_debt_table(text: str) -> dict:
+    # 借入金等明細表 [テキストブロック]を
+    # {"unit": 金額の単位(円への倍率), "rows": [{"区分", "当期首残高", "当期末残高", "平均利率"}, ...]} にする
+    # 区分の後に 当期首残高・当期末残高・平均利率 が続く部分を行とみなし、値がない("－")場合はNoneとする
+    table: dict = {"unit": 1, "rows": []}
+    if not isinstance(text, str) or text == "" or NOT_APPLICABLE in text:
+        return table
+    text = _normalize(text)
+    for unit, multiplier in UNITS.items():
+        if unit in text:
+            table["unit"] = multiplier
+            break
+    tokens = _TOKEN.findall(text)
+    label: list[str] = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if (
+            len(label) > 0
+            and i + 2 < len(tokens)
+            and _is_amount(token)
+            and _is_amount(tokens[i + 1])
+            and _is_rate(tokens[i + 2])
+        ):
+            table["rows"].append(
+                {
+                    "区分": "".join(label),
+                    "当期首残高": _to_number(token),
+                    "当期末残高": _to_number(tokens[i + 1]),
+                    "平均利率": _to_number(tokens[i + 2]),
+                }
+            )
+            label = []
+            i += 3
+            # 返済期限(2025年~2030年、"－"など)を飛ばす。次の区分の先頭の数字は飛ばさない
+            while (
+                i < len(tokens)
+                and (_is_amount(tokens[i]) or _REPAYMENT_TERM.fullmatch(tokens[i]))
+                and not _is_label_number(tokens, i)
+            ):
+                i += 1
+            continue
+        if token.endswith(HEADER_END):
+            # 見出し(区分 当期首残高 当期末残高 平均利率 返済期限)は区分に含めない
+            label = []
+        elif not _is_amount(token) or len(label) > 0 or _is_label_number(tokens, i):
+            # 区分の数字(１年以内など)は区分に含め、区分の前の数字は捨てる
+            label.append(token)
+        i += 1
+    if len(table["rows"]) == 0:
+        logging.warning("借入金等明細表から借入金の行を読み取れませんでした")
+    return table
+
+
+def weighted_average_rate(table: dict) -> float:
+    # 当期末残高で重み付けした平均利率(%)。残高・利率のない行は除く
+    total_weighted_rate = 0.0
+    total_balance = 0.0
+    for row in table["rows"]:
+        if row["当期末残高"] is None or row["平均利率"] is None:
+            continue
+        total_weighted_rate += row["当期末残高"] * row["平均利率"]
+        total_balance += row["当期末残高"]
+    return total_weighted_rate / total_balance if total_balance else 0
+
+
+def get_debt_table(text: str, doc_id: str | None = None) -> dict:
+    # docIDを指定した場合は、解析結果をZIPのキャッシュと同じデータベースに保存して使い回す
+    if doc_id is None:
+        return parse_debt_table(text)
+    table = load_debt_table(doc_id, DEBT_TABLE_PARSER_VERSION)
+    if table is None:
+        table = parse_debt_table(text)
+        save_debt_table(doc_id, DEBT_TABLE_PARSER_VERSION, table)
+    return table
@@ -1,32 +1,170 @@
 import os
+import random
+import threading
 import time
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from cache import load_doc_list, load_zip, save_doc_list, save_zip
+from tracing import tracer
 
 API_KEY = os.getenv("KEY")
 BASE_URL = "https://disclosure.edinet-fsa.go.jp/api/v2/documents"
 DOC_LIST_URL = BASE_URL + ".json"
 DOC_TYPE = 5  # CSV
+# 1秒あたりのリクエスト数の上限(全スレッド共通)と、連続して送れるリクエスト数
+REQUESTS_PER_SECOND = float(os.getenv("EDINET_REQUESTS_PER_SECOND", 1.0))
+BURST = int(os.getenv("EDINET_BURST", 1))
+# (接続, 読み込み)のタイムアウト(秒)
+TIMEOUT = (10, 120)
+# 429、5xx、接続エラーの場合の再試行回数と、待機時間の基準(秒)
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+POOL_SIZE = 16
+
+
+class TokenBucket:
+    # 全スレッドで共有し、1秒あたりrate回、最大capacity回まで連続してリクエストを送れるようにする
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class FetchMetrics:
+    # リクエスト数、再試行回数、失敗回数、レイテンシを集計する
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes = 0
+        self.latencies: list[float] = []
+
+    def record(self, latency: float, size=0, retry=False, failure=False):
+        with self._lock:
+            self.requests += 1
+            self.retries += int(retry)
+            self.failures += int(failure)
+            self.bytes += size
+            self.latencies.append(latency)
+
+    def summary(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "latency_mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            "latency_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+def _create_session() -> requests.Session:
+    # 接続を使い回すため、スレッド数に合わせた接続プールを持つセッションを作成する
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+rate_limiter = TokenBucket(REQUESTS_PER_SECOND, BURST)
+metrics = FetchMetrics()
+session = _create_session()
+
+
+def get_backoff_time(attempt: int, retry_after: str | None = None) -> float:
+    # Retry-Afterが指定されている場合はそれに従い、それ以外は指数バックオフにジッターを加える
+    if retry_after is not None and retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def request_with_retry(url: str, params: dict) -> requests.Response:
+    # 429、5xx、接続エラーの場合はバックオフして再試行し、再試行しても失敗した場合は例外を送出する
+    # metricsの失敗回数は、再試行を含めて最後まで失敗したリクエストのみを数える
+    error: Exception | None = None
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        start = time.monotonic()
+        response = None
+        try:
+            response = session.get(url, params=params, timeout=TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        size = len(response.content) if response is not None else 0
+        if response is not None and response.status_code not in RETRY_STATUS_CODES:
+            metrics.record(time.monotonic() - start, size, retry=attempt > 0)
+            return response
+        metrics.record(time.monotonic() - start, size, retry=attempt > 0, failure=attempt == MAX_RETRIES)
+        retry_after = None
+        if response is not None:
+            error = requests.HTTPError(f"{response.status_code} Error for url: {response.url}", response=response)
+            retry_after = response.headers.get("Retry-After")
+        if attempt < MAX_RETRIES:
+            time.sleep(get_backoff_time(attempt, retry_after))
+    assert error is not None
+    raise error
 
 
-def fetch_annual_report_by_docid(doc_id: str):
+def fetch_annual_report_by_docid(doc_id: str, use_cache=True):
+    # 提出済みの書類は変更されないため、ダウンロード済みのZIPがあればそれを返す
+    if use_cache:
+        with tracer.stage("cache.load_zip"):
+            cached = load_zip(doc_id)
+        if cached is not None:
+            return cached
     doc_parameter = {"type": DOC_TYPE, "Subscription-Key": API_KEY}
-    response = requests.get(f"{BASE_URL}/{doc_id}", params=doc_parameter)
-    time.sleep(1)
+    with tracer.stage("fetch.download_zip") as span:
+        response = request_with_retry(f"{BASE_URL}/{doc_id}", doc_parameter)
+        span["bytes"] = len(response.content)
     assert response.status_code == 200
+    if use_cache:
+        save_zip(doc_id, response.content)
     return response.content
 
 
-def fetch_doc_list(date: str):
+def fetch_doc_list(date: str, use_cache=True):
     # 2023-11-30 00:00:00
     # dateをYYYY-MM- DD形式に変換
     if " " in date:
         date = date.split(" ")[0]
+    # 取得済みの書類一覧があればAPIを呼ばずに返す
+    if use_cache:
+        cached = load_doc_list(date)
+        if cached is not None:
+            return cached
     doc_list_parameter = {
         "date": date,
         "type": 2,  # 提出書類を取得します。
         "Subscription-Key": API_KEY,
     }
-    result = requests.get(DOC_LIST_URL, doc_list_parameter)
-    time.sleep(1)
-    return result.json()
+    with tracer.stage("fetch.doc_list") as span:
+        response = request_with_retry(DOC_LIST_URL, doc_list_parameter)
+        span["bytes"] = len(response.content)
+    result = response.json()
+    # エラー時のレスポンスにはresultsが含まれないため、キャッシュしない
+    if use_cache and "results" in result:
+        save_doc_list(date, result)
+    return result
@@ -1,21 +1,32 @@
 import csv
+import fnmatch
 import glob
 import io
+import logging
 import os
 import zipfile
+from collections.abc import Iterator
 
 import pandas as pd
 
-from type import japanese_dict
-from utils import convert_to_thousand_separated
+from tracing import traced
+from type import japanese_dict, percentage_keys
+from utils import convert_to_thousand_separated, format_percentage
 
 BASE_PATH = "./EDINET/"
 ROW_CSV_HEADER = "row_"
 PREPROCESSED_CSV_HEADER = "preprocessed_"
+DOC_CSV_PATTERN = "XBRL_TO_CSV/jpcrp*.csv"
+# 途中経過(row_, preprocessed_)の保存形式。"csv", "parquet", "feather"のいずれか、"none"の場合は保存しない
+INTERMEDIATE_FORMAT = os.getenv("EDINET_INTERMEDIATE_FORMAT", "csv")
+INTERMEDIATE_FORMATS = ("csv", "parquet", "feather", "none")
+# 列指向の形式で保存する際に、カテゴリ型に変換する列(同じ文字列が繰り返し現れるため)
+CATEGORICAL_COLUMNS = ["要素ID", "項目名", "相対年度", "連結・個別"]
 if not os.path.exists(BASE_PATH):
     os.makedirs(BASE_PATH)
 
 
+@traced("extract_zip")
 def extract_zip(zip_data, directory: str):
     """ZIPファイルを指定されたディレクトリに解凍する
     Copy codeArgs:zip_data (bytes): ZIPファイルのバイナリデータ
@@ -25,38 +36,86 @@ def extract_zip(zip_data, directory: str):
         zip_ref.extractall(path)
 
 
+@traced("parse_csv")
 def csv_to_df(save_dir):
     pattern = BASE_PATH + save_dir + "/" + "XBRL_TO_CSV/jpcrp*.csv"
-    print(pattern)
+    logging.debug(pattern)
     file_path = glob.glob(pattern)  # 最初のファイルのみを取得
-    print(file_path)
+    logging.debug(file_path)
     assert len(file_path) == 1
-    df = pd.read_csv(file_path[0], encoding="utf-16", sep=None, engine="python")
+    df = pd.read_csv(file_path[0], encoding="utf-16", sep="\t", dtype=str)
     return df
 
 
-def clean_up_directory(save_dir):
-    pattern = BASE_PATH + save_dir + "/" + "XBRL_TO_CSV/"
-    files = glob.glob(pattern + "*")
-    for f in files:
-        os.remove(f)
-    os.rmdir(pattern)
+@traced("parse_csv")
+def read_doc_from_zip(zip_data: bytes) -> pd.DataFrame:
+    # ZIPを解凍せずに、XBRL_TO_CSV/jpcrp*.csvをメモリ上で読み込む
+    # CSVはUTF-16のタブ区切りのため、区切り文字を指定してCエンジンで読み込む
+    with zipfile.ZipFile(io.BytesIO(zip_data)) as zip_ref:
+        members = fnmatch.filter(zip_ref.namelist(), DOC_CSV_PATTERN)
+        assert len(members) == 1
+        with zip_ref.open(members[0]) as file:
+            return pd.read_csv(file, encoding="utf-16", sep="\t", dtype=str)
 
 
-def save_doc_from_zip(zip_file: bytes, save_dir: str, title: str):
-    extract_zip(zip_file, save_dir)
-    # 選択したdocIDのファイルのdocDescriptionを取得
-    df = csv_to_df(save_dir)
-    save_path = os.path.join(BASE_PATH, save_dir, ROW_CSV_HEADER + title)
-    df.to_csv(
-        save_path,
-        index=False,
-        encoding="utf-8",
-    )
-    clean_up_directory(save_dir)
+def read_doc_chunks_from_zip(zip_data: bytes, usecols: list[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    # read_doc_from_zipと同じCSVを、usecolsの列だけchunksize行ずつ読み込む(大きな書類でもメモリを抑えるため)
+    with zipfile.ZipFile(io.BytesIO(zip_data)) as zip_ref:
+        members = fnmatch.filter(zip_ref.namelist(), DOC_CSV_PATTERN)
+        assert len(members) == 1
+        with zip_ref.open(members[0]) as file:
+            yield from pd.read_csv(file, encoding="utf-16", sep="\t", dtype=str, usecols=usecols, chunksize=chunksize)
+
+
+def write_intermediate(df: pd.DataFrame, save_path: str):
+    # 拡張子に応じた形式で保存する
+    extension = os.path.splitext(save_path)[1]
+    if extension == ".csv":
+        df.to_csv(
+            save_path,
+            index=False,
+            encoding="utf-8",
+        )
+        return
+    df = df.astype({column: "category" for column in CATEGORICAL_COLUMNS if column in df.columns})
+    if extension == ".parquet":
+        df.to_parquet(save_path, index=False)
+    elif extension == ".feather":
+        df.reset_index(drop=True).to_feather(save_path)
+    else:
+        raise ValueError(f"Unsupported intermediate file: {save_path}")
+
+
+def read_intermediate(saved_path: str) -> pd.DataFrame:
+    extension = os.path.splitext(saved_path)[1]
+    if extension == ".parquet":
+        return pd.read_parquet(saved_path)
+    if extension == ".feather":
+        return pd.read_feather(saved_path)
+    return pd.read_csv(saved_path, encoding="utf-8")
+
+
+def save_intermediate(
+    df: pd.DataFrame, save_dir: str, header: str, title: str, file_format=INTERMEDIATE_FORMAT
+) -> str | None:
+    # file_formatが"none"の場合は保存せずにNoneを返す
+    assert file_format in INTERMEDIATE_FORMATS
+    if file_format == "none":
+        return None
+    save_path = os.path.join(BASE_PATH, save_dir, header + os.path.splitext(title)[0] + "." + file_format)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    write_intermediate(df, save_path)
     return save_path
 
 
+def save_doc_from_zip(zip_file: bytes, save_dir: str, title: str, file_format=INTERMEDIATE_FORMAT):
+    # 選択したdocIDのファイルのdocDescriptionを取得
+    df = read_doc_from_zip(zip_file)
+    # 保存が目的のため、"none"の場合もcsvで保存する
+    return save_intermediate(df, save_dir, ROW_CSV_HEADER, title, "csv" if file_format == "none" else file_format)
+
+
+@traced("export")
 def export_df_to_csv(data, save_path):
     # utf-8-sigにすることで、Excelで開いた際に文字化けを防ぐ
     with open(save_path, "w", encoding="utf-8-sig", newline="") as file:
@@ -65,6 +124,8 @@ def export_df_to_csv(data, save_path):
         for key, values in data.items():
             # 日本語ラベルに変換、見つからない場合は元のキーを使用
             japanese_label = japanese_dict.get(key, key)
+            # 比率は"12.34%"、それ以外は3桁区切りにする
+            convert = format_percentage if key in percentage_keys else convert_to_thousand_separated
 
             if isinstance(values, dict):
                 # 辞書型の場合、各サブキーに対して新たな行を作成
@@ -78,7 +139,20 @@ def export_df_to_csv(data, save_path):
             else:
                 # リストや単一の値の場合、通常通りに処理
                 if isinstance(values, list) or isinstance(values, tuple):
-                    writer.writerow([japanese_label] + list(map(convert_to_thousand_separated, values)))
+                    writer.writerow([japanese_label] + list(map(convert, values)))
                 else:
-                    writer.writerow([japanese_label, convert_to_thousand_separated(values)])
+                    writer.writerow([japanese_label, convert(values)])
+    print(f"Exported to {save_path}")
+
+
+@traced("export")
+def export_time_series_to_csv(df: pd.DataFrame, save_path: str):
+    # 行が指標、列が年度の表を、export_df_to_csvと同じ書式で保存する
+    with open(save_path, "w", encoding="utf-8-sig", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["年"] + [str(year) for year in df.columns])
+        for key, values in df.iterrows():
+            japanese_label = japanese_dict.get(key, key)
+            convert = format_percentage if key in percentage_keys else convert_to_thousand_separated
+            writer.writerow([japanese_label] + list(map(convert, values.tolist())))
     print(f"Exported to {save_path}")
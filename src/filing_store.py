@@ -0,0 +1,125 @@
+import json
+import os
+from collections.abc import Iterable
+
+import numpy as np
+import pandas as pd
+
+from financial_data import FinancialDataProcessor
+from preprocess import NUMERIC_COLUMN, PREPROCESS_COLUMNS, parse_values
+
+# 前処理済みの書類をまとめて保存する形式
+#   strings.json: 列ごとの文字列の一覧(コードはこの一覧の位置)
+#   {列}.npy: 文字列の列のコード(int32、値がない場合は-1)
+#   values.npy: 数値に変換した値(前処理のNUMERIC_COLUMN、float64、それ以外はNaN)
+#   texts.npy, text_rows.npy, text_offsets.npy: 数値でない値(テキストブロック、DEIなど)
+#       texts.npyはUTF-8で連結した文字列、text_rowsは値の行番号、text_offsetsは各値の開始位置
+#   filings.json: docID → 行・テキストの範囲、年度
+# .npyはメモリマップで開くため、書類を開く際にCSVの解析や文字列の作成を行わない
+STORE_VERSION = 2
+CODE_COLUMNS = {"要素ID": "element_ids", "項目名": "item_names", "相対年度": "terms", "連結・個別": "categories"}
+VALUE_COLUMN = "値"
+
+
+def _split_values(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    # (数値, 文字列として残す行か)を返す。数値は前処理で変換済みのもの(NUMERIC_COLUMN)を使う
+    df = parse_values(df.copy())
+    return df[NUMERIC_COLUMN].to_numpy(dtype=np.float64), df[VALUE_COLUMN].notna().to_numpy(dtype=bool)
+
+
+def write_filing_store(path: str, filings: Iterable[tuple[str, int | None, pd.DataFrame]]) -> str:
+    # (docID, 年度, 前処理済みのデータ)をpathのディレクトリに保存する(既にある場合は置き換える)
+    os.makedirs(path, exist_ok=True)
+    dictionaries: dict[str, dict[str, int]] = {column: {} for column in CODE_COLUMNS}
+    codes: dict[str, list[np.ndarray]] = {column: [] for column in CODE_COLUMNS}
+    values: list[np.ndarray] = []
+    text_rows: list[np.ndarray] = []
+    texts: list[bytes] = []
+    index: dict[str, dict] = {}
+    rows = 0
+    for doc_id, year, df in filings:
+        df = df.reindex(columns=[*PREPROCESS_COLUMNS, NUMERIC_COLUMN])
+        for column, dictionary in dictionaries.items():
+            column_values = df[column].astype("string")
+            # 新しい文字列にコードを振り、書類全体で同じ文字列は同じコードにする
+            for value in column_values.dropna().unique():
+                dictionary.setdefault(value, len(dictionary))
+            codes[column].append(column_values.map(dictionary).fillna(-1).to_numpy(dtype=np.int32))
+        filing_values, is_text = _split_values(df)
+        values.append(filing_values)
+        text_rows.append(np.flatnonzero(is_text).astype(np.int64) + rows)
+        index[doc_id] = {
+            "start": rows,
+            "stop": rows + len(df),
+            "text_start": len(texts),
+            "text_stop": len(texts) + int(is_text.sum()),
+            "year": None if year is None or pd.isna(year) else int(year),
+        }
+        texts.extend(str(text).encode("utf-8") for text in df[VALUE_COLUMN].to_numpy(dtype=object)[is_text])
+        rows += len(df)
+    for column, name in CODE_COLUMNS.items():
+        np.save(os.path.join(path, f"{name}.npy"), _concat(codes[column], np.int32))
+    np.save(os.path.join(path, "values.npy"), _concat(values, np.float64))
+    np.save(os.path.join(path, "text_rows.npy"), _concat(text_rows, np.int64))
+    np.save(os.path.join(path, "text_offsets.npy"), np.cumsum([0] + [len(text) for text in texts], dtype=np.int64))
+    np.save(os.path.join(path, "texts.npy"), np.frombuffer(b"".join(texts), dtype=np.uint8))
+    with open(os.path.join(path, "strings.json"), "w", encoding="utf-8") as file:
+        json.dump({column: list(dictionary) for column, dictionary in dictionaries.items()}, file, ensure_ascii=False)
+    # filings.jsonを最後に書き、途中で止まった保存先は開けないようにする
+    with open(os.path.join(path, "filings.json"), "w", encoding="utf-8") as file:
+        json.dump({"version": STORE_VERSION, "filings": index}, file, ensure_ascii=False)
+    return path
+
+
+def _concat(arrays: list[np.ndarray], dtype) -> np.ndarray:
+    return np.concatenate(arrays).astype(dtype) if len(arrays) > 0 else np.array([], dtype=dtype)
+
+
+def write_filing_store_from_frame(path: str, df: pd.DataFrame) -> str:
+    # bulk_loader.load_filingsの結果(docID, year列を持つ縦持ちのデータ)を保存する
+    groups = df.groupby("docID", observed=True, sort=False)
+    return write_filing_store(path, ((str(doc_id), group["year"].iloc[0], group) for doc_id, group in groups))
+
+
+class FilingStore:
+    # write_filing_storeで保存した書類を開く。文字列の一覧以外はメモリマップで、必要な範囲だけ読み込まれる
+    def __init__(self, path: str):
+        with open(os.path.join(path, "filings.json"), encoding="utf-8") as file:
+            index = json.load(file)
+        assert index["version"] == STORE_VERSION, f"{path}は古い形式のため、保存し直してください。"
+        self.filings: dict[str, dict] = index["filings"]
+        with open(os.path.join(path, "strings.json"), encoding="utf-8") as file:
+            strings = json.load(file)
+        # 列ごとの文字列はすべての書類で共有する
+        self._categories = {column: pd.Index(strings[column], dtype=object) for column in CODE_COLUMNS}
+        self._codes = {
+            column: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for column, name in CODE_COLUMNS.items()
+        }
+        self._values = np.load(os.path.join(path, "values.npy"), mmap_mode="r")
+        self._text_rows = np.load(os.path.join(path, "text_rows.npy"), mmap_mode="r")
+        self._text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self._texts = np.load(os.path.join(path, "texts.npy"), mmap_mode="r")
+
+    @property
+    def doc_ids(self) -> list[str]:
+        return list(self.filings)
+
+    def get_df(self, doc_id: str) -> pd.DataFrame:
+        # remove_unnecessary_columnsの結果と同じ列のデータ。文字列の列はカテゴリ型
+        filing = self.filings[doc_id]
+        start, stop = filing["start"], filing["stop"]
+        columns = {
+            column: pd.Categorical.from_codes(self._codes[column][start:stop], categories=self._categories[column])
+            for column in CODE_COLUMNS
+        }
+        texts = np.full(stop - start, None, dtype=object)
+        for position in range(filing["text_start"], filing["text_stop"]):
+            text = bytes(self._texts[self._text_offsets[position] : self._text_offsets[position + 1]])
+            texts[self._text_rows[position] - start] = text.decode("utf-8")
+        return pd.DataFrame({**columns, VALUE_COLUMN: texts, NUMERIC_COLUMN: np.asarray(self._values[start:stop])})
+
+    def get_processor(self, doc_id: str, year: int | None = None) -> FinancialDataProcessor:
+        # yearを指定しない場合は、保存時の年度を使う
+        year = self.filings[doc_id]["year"] if year is None else year
+        assert year is not None, f"docID: {doc_id} の年度がわかりません。"
+        return FinancialDataProcessor(self.get_df(doc_id), year, doc_id)
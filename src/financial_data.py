@@ -1,306 +1,362 @@
+import functools
 import logging
+import math
+from typing import cast
 
 import pandas as pd
 
 from calculate import (
     calculate_growth_ratio,
     calculate_invested_capital,
+    calculate_percentage,
     calculate_ratio,
-    calculate_str_ratio,
     calculate_weighted_average_cost,
 )
+from item_mapping import item_mapping
+from period import PERIOD_TYPES, PERIODS, get_fiscal_year, get_period_type
+from preprocess import NUMERIC_COLUMN, parse_values
+from tracing import traced
 from type import FinancialSummary, NetOperatingCapital
-from utils import convert_str_to_float
+
+# get_financial_summary、get_net_operating_capitalが返す項目(レポートの行の順番)
+FINANCIAL_SUMMARY_KEYS = (
+    "revenues",
+    "revenue_growth_rate",
+    "cost_of_sales",
+    "売上総利益",
+    "売上総利益率",
+    "selling_general_and_administrative_expenses",
+    "operating_profits",
+    "営業利益率",
+    "実効税率",
+    "nopat",
+    "deprecations",
+    "capital_expenditure",
+)
+NET_OPERATING_CAPITAL_KEYS = (
+    "sum_of_sales_receivables",
+    "sum_of_inventories",
+    "sum_of_purchase_debt",
+    "sum_of_net_operating_capitals",
+    "fluctuation_of_net_operating_capitals",
+)
+
+
+def _memoized(method):
+    # インスタンス・引数ごとに結果を保存し、同じ値を二度計算しないようにする
+    # 結果のリストや辞書は共有されるため、呼び出し側で変更しないこと
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        key = (method.__name__, *args)
+        if key not in self._memo:
+            self._memo[key] = method(self, *args)
+        return self._memo[key]
+
+    return wrapper
 
 
 class FinancialDataProcessor:
 
-    def __init__(self, df: pd.DataFrame, year: int):
+    def __init__(self, df: pd.DataFrame, year: int, doc_id: str | None = None, period: str | None = None):
         self.df = df
+        # 指定した場合、借入金等明細表の解析結果を書類ごとにキャッシュする
+        self.doc_id = doc_id
         self.year = int(year)
+        # 書類の当会計期間の種類(FY, HY, Q1〜Q3)と事業年度はDEIから判定する
+        self.period_type = get_period_type(df)
+        self.fiscal_year = get_fiscal_year(df, self.year)
+        # periodは期間の種類(period.PERIODS)。指定しない場合は当会計期間の種類から決める
+        # 四半期報告書では、既定で期首からの累計("cumulative")の値を使う
+        self.period = PERIOD_TYPES[self.period_type] if period is None else period
+        self.terms = PERIODS[self.period]
         self.TAX_RATE = 0.3
         self.TAX_COEFFICIENT = 1 - self.TAX_RATE
-        # 売上債権
-        self.sales_receivables_items = (
-            "売掛金",
-            "契約資産",
-            "前渡金",
-            "電子記録債権",
-            "受取手形",
-            "その他、流動資産",
-        )
-        # 棚卸資産
-        self.inventories_items = ("商品及び製品", "仕掛品", "原材料及び貯蔵品")
-        # 仕入債務
-        self.purchase_debt_items = (
-            "買掛金",
-            "支払手形",
-            "電子記録債務",
-            "未払費用",
-            "未払金",
-            "契約負債",
-            "前受金",
-            "その他、流動負債",
-        )
-        # 有利子負債
-        self.interest_bearing_debt_items = (
-            "短期借入金",
-            "短期社債",
-            "コマーシャルペーパー",
-            "リース債務（流動負債）",
-            "１年内返済予定の長期借入金",
-            "長期借入金",
-            "社債",
-            "転換社債",
-            "新株予約権付転換社債",
-            "新株予約権付社債",
-            "リース債務（固定負債）",
-        )
+        # 売上債権、棚卸資産、仕入債務、有利子負債の項目(key)はitem_mapping.jsonで定義する
+        self.sales_receivables_items = item_mapping.groups["sales_receivables"]
+        self.inventories_items = item_mapping.groups["inventories"]
+        self.purchase_debt_items = item_mapping.groups["purchase_debt"]
+        self.interest_bearing_debt_items = item_mapping.groups["interest_bearing_debt"]
+        self._memo: dict[tuple, object] = {}
+        self._build_index()
 
-    def _get_item_name(self, item_name, term=None) -> str:
+    @traced("financial_data.build_index")
+    def _build_index(self):
+        # 指標(key) → [(連結・個別の優先度, 行番号, 相対年度, 値), ...] の索引を一度だけ作成する
+        # keyは項目名・要素IDからitem_mappingで引く(正規表現の評価は全書類で共有のキャッシュで済ませる)
+        # 優先度は 連結=0, 個別=1, その他=2 とし、優先度・行番号順に並べておくことで
+        # 検索時は先頭から相対年度が一致するものを探すだけで済む
+        # 値は前処理で数値に変換済みのもの(NUMERIC_COLUMN)、数値でない場合(テキストブロックなど)は文字列とする
+        self._index: dict[str, list[tuple[int, int, str, float | str]]] = {}
+        if NUMERIC_COLUMN not in self.df.columns:
+            # 数値に変換していない古い前処理済みファイルは、ここでまとめて変換する
+            self.df = parse_values(self.df.copy())
+        numbers = self.df[NUMERIC_COLUMN]
+        values = numbers.astype(object).where(numbers.notna(), self.df["値"])
+        columns = [self.df[column].tolist() for column in ["項目名", "相対年度", "連結・個別"]] + [values.tolist()]
+        # 要素IDのない古い前処理済みファイルは、項目名のみで引く
+        element_ids = self.df["要素ID"].tolist() if "要素ID" in self.df.columns else [None] * len(self.df)
+        for position, (item_name, term, category, value, element_id) in enumerate(zip(*columns, element_ids)):
+            keys = item_mapping.resolve(item_name, element_id)
+            if len(keys) == 0:
+                continue
+            term = term if isinstance(term, str) else ""
+            category = category if isinstance(category, str) else ""
+            if "連結" in category:
+                priority = 0
+            elif "個別" in category:
+                priority = 1
+            else:
+                priority = 2
+            for key in keys:
+                self._index.setdefault(key, []).append((priority, position, term, value))
+        for entries in self._index.values():
+            entries.sort()
+
+    def _get_item_name(self, key: str, term=None) -> str:
+        # keyに該当する行があれば(termを指定した場合は相対年度が一致する行があれば)keyを返す
+        entries = self._index.get(key, [])
         if term:
-            values = self.df.loc[
-                (self.df["項目名"] == item_name) & (self.df["相対年度"].str.contains(term)),
-                "項目名",
-            ].values
-            if len(values) > 0:
-                return values[0]
-        else:
-            values = self.df.loc[self.df["項目名"] == item_name, "項目名"].values[0]
-            if len(values) > 0:
-                return values[0]
+            if any(term in entry_term for _, _, entry_term, _ in entries):
+                return key
+        elif len(entries) > 0:
+            return key
         return ""
 
-    def _get_float_values_by_name(self, item_name: str, terms: list[str], regex=False) -> list[float]:
+    def _get_float_values_by_name(self, key: str, terms: list[str]) -> list[float]:
         # termsの長さのリストを作成
+        # 数値でない値(テキスト)、値のない行は0とする
         result = [0.0] * len(terms)
-        try:
-            for index, term in enumerate(terms):
-                value = self._get_first_value_by_name(item_name, term, regex)
-                if value and value.replace(".", "").replace("-", "").isnumeric():
-                    result[index] = convert_str_to_float(value)
-        except IndexError:
-            logging.error(f"Value for {item_name} not found for term {term}")
-            return result
+        for index, term in enumerate(terms):
+            value = self._get_first_value_by_name(key, term)
+            if isinstance(value, float) and not math.isnan(value):
+                result[index] = value
         return result
 
-    def _get_multiple_float_values_by_name(self, item_name: str, term: str) -> list[float]:
-        values = self.df.loc[
-            self.df["項目名"].str.contains(item_name, regex=True) & self.df["相対年度"].str.contains(term),
-            "値",
-        ]
-        return [convert_str_to_float(value) for value in values]
-
-    def _get_first_value_by_name(
-        self,
-        item_name: str,
-        term=None,
-        regex=False,
-    ) -> str:
-        if not any(self.df["項目名"].str.contains(item_name, regex=regex)):
-            print(f"Item name {item_name} not found")
+    def _get_multiple_float_values_by_name(self, key: str, term: str) -> list[float]:
+        values = [value for _, _, entry_term, value in self._index.get(key, []) if term in entry_term]
+        return [value for value in values if isinstance(value, float) and not math.isnan(value)]
+
+    def _get_first_value_by_name(self, key: str, term=None) -> float | str:
+        entries = self._index.get(key, [])
+        if len(entries) == 0:
+            logging.debug(f"Item {key} not found")
             return ""
 
-        # query_base = self.df["項目名"].str.contains(item_name, regex=regex)
-        # regex = Falseの場合、完全一致で検索, Trueの場合、matchで検索
-        if regex:
-            query_base = self.df["項目名"].str.match(item_name)
-        else:
-            # containsだと、部分一致で検索されるため、完全一致で検索する
-            query_base = self.df["項目名"] == item_name
         if term:
-            query_term = self.df["相対年度"].str.contains(term)
-            # 連結、個別、その他の順で値を検索
-            for category in ["連結", "個別"]:
-                match = self.df.loc[
-                    query_base & query_term & (self.df["連結・個別"].str.contains(category)),
-                    "値",
-                ]
-                if not match.empty:
-                    return match.iloc[0]
-            # 連結も個別も見つからなかった場合、その他の値を検索
-            other_match = self.df.loc[
-                query_base & query_term & (~self.df["連結・個別"].str.contains("連結|個別", regex=True)),
-                "値",
-            ]
-            if not other_match.empty:
-                return other_match.iloc[0]
+            # 索引は連結、個別、その他の順に並んでいるため、最初に相対年度が一致した値を返す
+            for _, _, entry_term, value in entries:
+                if term in entry_term:
+                    return value
             return ""  # どのカテゴリーにも該当する値がない場合
         else:
             # termが指定されていない場合は、最初に見つかった値を返す
-            return self.df.loc[query_base, "値"].iloc[0]
+            return min(entries, key=lambda entry: entry[1])[3]
 
-    def get_interest_bearing_debt(self):
-        interest_bearing_debt_item_names = set(
-            self._get_item_name(x, "当期末")
-            for x in self.interest_bearing_debt_items
-            if self._get_item_name(x, "当期") != ""
+    @_memoized
+    def _get_float_values(self, key: str, terms: tuple[str, ...]) -> list[float]:
+        return self._get_float_values_by_name(key, list(terms))
+
+    @_memoized
+    def _get_existing_items(self, items: tuple[str, ...], term: str) -> tuple[str, ...]:
+        # itemsのうち、相対年度がtermの値があるもの
+        return tuple(x for x in items if self._get_item_name(x, term) != "")
+
+    @_memoized
+    def _get_sums_of_items(self, items: tuple[str, ...], term: str, terms: tuple[str, ...]) -> dict[str, list[float]]:
+        # 相対年度がtermの値がある項目のみ、termsの値を取得する
+        return {item: self._get_float_values(item, terms) for item in self._get_existing_items(items, term)}
+
+    @_memoized
+    def _get_revenues(self) -> list[float]:
+        return self._get_float_values("revenues", self.terms["duration"])
+
+    @_memoized
+    def _get_cost_of_sales(self) -> list[float]:
+        return self._get_float_values("cost_of_sales", self.terms["duration"])
+
+    @_memoized
+    def _get_gross_profit(self) -> list[float]:
+        return [x - y for x, y in zip(self._get_revenues(), self._get_cost_of_sales())]
+
+    @_memoized
+    def _get_selling_general_and_administrative_expenses(self) -> list[float]:
+        return self._get_float_values("selling_general_and_administrative_expenses", self.terms["duration"])
+
+    @_memoized
+    def _get_operating_profits(self) -> list[float]:
+        return self._get_float_values("operating_profits", self.terms["duration"])
+
+    @_memoized
+    def _get_effective_tax_rates(self) -> list[tuple[float, float]]:
+        # (法人税等, 税引前当期純利益)の組
+        return list(
+            zip(
+                self._get_float_values("income_taxes", self.terms["duration"]),
+                self._get_float_values("profit_before_tax", self.terms["duration"]),
+            )
         )
-        interest_bearing_debt = {
-            item_name: self._get_float_values_by_name(item_name, ["前期末", "当期末"])
-            for item_name in interest_bearing_debt_item_names
-        }
-        return interest_bearing_debt
 
-    def get_report(self):
-        # consolidated_bs_title = "連結貸借対照表 [テキストブロック]"
-        # bs_title = "貸借対照表 [テキストブロック]"
-        # # 連結貸借対照表を探して、なければ単体貸借対照表を探す
-        # bs = self._get_first_value_by_name(consolidated_bs_title, ["当期"])
-        # if bs == "":
-        #     bs = self._get_first_value_by_name(bs_title, ["当期"])
-        #     # 見つからない場合はエラー
-        #     if bs == "":
-        #         raise Exception("貸借対照表が見つかりませんでした")
+    @_memoized
+    def _get_nopats(self) -> list[float]:
+        # 実効税率は小数第2位で丸め、税引前利益が0の場合は0とする
+        effective_tax_rates = [0.0 if y == 0 else calculate_ratio(x, y, 2) for x, y in self._get_effective_tax_rates()]
+        return [x * (1 - y) for x, y in zip(self._get_operating_profits(), effective_tax_rates)]
+
+    @_memoized
+    def _get_deprecations(self) -> list[float]:
+        return self._get_float_values("deprecations", self.terms["duration"])
 
+    @_memoized
+    def _get_capital_expenditure(self) -> list[float]:
+        return self._get_float_values("capital_expenditure", self.terms["duration"][1:])
+
+    @_memoized
+    def _get_debt_rate(self) -> float:
         # 借入金等明細表、連結財務諸表 [テキストブロック]を探して、なければ単体財務諸表を探す
-        debt_detail = self._get_first_value_by_name(r"借入金等明細表、連結財務諸表 \[テキストブロック\]", "当期", True)
+        term = self.terms["duration"][1]
+        debt_detail = self._get_first_value_by_name("consolidated_debt_detail", term)
         if debt_detail == "":
-            debt_detail = self._get_first_value_by_name(r"借入金等明細表、財務諸表 \[テキストブロック\]", "当期", True)
-        debt_rate = calculate_weighted_average_cost(debt_detail)
-        financial_summary = self.get_financial_summary()
-        interest_bearing_debt = self.calc_interest_bearing_debt()
-        net_working_capital = self.get_net_operating_capital()
-        # money_unit = get_money_unit(bs)
-        idle_assets = self.get_idle_assets()
-        number_of_stock = self._get_float_values_by_name("発行済株式総数（普通株式）", ["当期末"])[0]
-        number_of_company_stock = self._get_float_values_by_name("自己名義所有株式数（株）、自己株式等", ["当期末"])
-        fcf = (
-            financial_summary["nopat"][1]
-            - financial_summary["capital_expenditure"][1]
-            + financial_summary["deprecations"][1]
-            - net_working_capital["fluctuation_of_net_operating_capitals"][1]
-        )
-        shareholders_equity = self._get_float_values_by_name("株主資本", ["前期", "当期"])
+            debt_detail = self._get_first_value_by_name("debt_detail", term)
+        # テキストブロックでない値(数値)の場合は、借入金等明細表がないものとする
+        return calculate_weighted_average_cost(debt_detail if isinstance(debt_detail, str) else "", self.doc_id)
+
+    @_memoized
+    def _get_shareholders_equity(self) -> list[float]:
         # treasure_stocks = self._get_float_values_by_name("自己株式", ["前期", "当期"])
-        invested_capital = calculate_invested_capital(
-            shareholders_equity, interest_bearing_debt["sum_of_interest_bearing_debt"]
+        return self._get_float_values("shareholders_equity", self.terms["balance"])
+
+    @_memoized
+    def _get_invested_capital(self) -> float:
+        return calculate_invested_capital(
+            self._get_shareholders_equity(), self.calc_interest_bearing_debt()["sum_of_interest_bearing_debt"]
+        )
+
+    @_memoized
+    def _get_number_of_stock(self) -> float:
+        number_of_stock = self._get_float_values("number_of_stock", self.terms["instant"][1:])[0]
+        number_of_company_stock = self._get_float_values("number_of_company_stock", self.terms["instant"][1:])[0]
+        return number_of_stock - number_of_company_stock
+
+    @_memoized
+    def _get_fcf(self) -> float:
+        return (
+            self._get_nopats()[1]
+            - self._get_capital_expenditure()[0]
+            + self._get_deprecations()[1]
+            - self.get_net_operating_capital()["fluctuation_of_net_operating_capitals"][1]
         )
+
+    @_memoized
+    def _get_net_trading_fixed_assets(self) -> list[float]:
         # bps = self._get_float_values_by_name("１株当たり純資産額", "前期", ["当期末"])
-        tangible_fixed_assets = self._get_float_values_by_name("有形固定資産", ["前期", "当期"])
+        tangible_fixed_assets = self._get_float_values("tangible_fixed_assets", self.terms["balance"])
         # 累計減価償却額
-        accumulated_depreciation_last_year = self._get_multiple_float_values_by_name("減価償却累計額、", "前期末")
-        accumulated_depreciation_current_year = self._get_multiple_float_values_by_name("減価償却累計額、", "当期末")
-        accumulated_depreciation = [sum(accumulated_depreciation_last_year), sum(accumulated_depreciation_current_year)]
-        net_trading_fixed_assets = [x - y for x, y in zip(tangible_fixed_assets, accumulated_depreciation)]
+        accumulated_depreciation = [
+            sum(self._get_multiple_float_values_by_name("accumulated_depreciation", term))
+            for term in self.terms["instant"]
+        ]
+        return [x - y for x, y in zip(tangible_fixed_assets, accumulated_depreciation)]
+
+    @_memoized
+    @traced("financial_data.get_interest_bearing_debt")
+    def get_interest_bearing_debt(self):
+        # 当期末の値がある項目のみを対象とする
+        terms = self.terms["instant"]
+        return self._get_sums_of_items(self.interest_bearing_debt_items, terms[1], terms)
+
+    def _get_report_items(self) -> dict:
+        # レポートの行 → 値を計算する関数。必要な行だけを計算できるよう、値は呼び出すまで計算しない
+        # 同じ値(nopatなど)を使う行があっても、_memoizedにより一度だけ計算される
+        revenues = self._get_revenues
+        nopats = self._get_nopats
         return {
             # "単位": str(money_unit),
-            "年": [str(self.year - 1), str(self.year)],
-            **financial_summary,
-            **net_working_capital,
-            "有利子負債合計": interest_bearing_debt["sum_of_interest_bearing_debt"],
-            "債権者コスト": ["-", debt_rate],
-            "その他": "",
-            "株主資本": shareholders_equity,
-            "株式数(自社株控除後)": ["-", number_of_stock - number_of_company_stock[0]],
-            **idle_assets,
-            "遊休資産": "",
-            "  ": "",
-            "FCF": ["-", fcf],
-            "現在価値に割り引いたFCF": "",
-            "    ": "",
-            "資本効率": "",
-            "投下資本": ["", invested_capital],
-            "税引き後営業利益率": [
-                calculate_str_ratio(x, y) for x, y in zip(financial_summary["nopat"], financial_summary["revenues"])
-            ],
-            "投下資本回転率": ["-", calculate_str_ratio(financial_summary["revenues"][1], invested_capital)],
-            "ROIC": ["-", calculate_str_ratio(financial_summary["nopat"][1], invested_capital)],
-            "         ": "",
-            "予測レシオ": "",
-            "売上原価：売上原価/売上高": [
-                calculate_str_ratio(
-                    financial_summary["cost_of_sales"][1],
-                    financial_summary["revenues"][1],
-                ),
+            "年": lambda: [str(self.year - 1), str(self.year)],
+            **{key: functools.partial(self._get_financial_summary_item, key) for key in FINANCIAL_SUMMARY_KEYS},
+            **{key: functools.partial(self._get_net_operating_capital_item, key) for key in NET_OPERATING_CAPITAL_KEYS},
+            "有利子負債合計": lambda: self.calc_interest_bearing_debt()["sum_of_interest_bearing_debt"],
+            "債権者コスト": lambda: ["-", self._get_debt_rate()],
+            "その他": lambda: "",
+            "株主資本": self._get_shareholders_equity,
+            "株式数(自社株控除後)": lambda: ["-", self._get_number_of_stock()],
+            "投資有価証券": lambda: self.get_idle_assets()["投資有価証券"],
+            "現金及び預金": lambda: self.get_idle_assets()["現金及び預金"],
+            "遊休資産": lambda: "",
+            "  ": lambda: "",
+            "FCF": lambda: ["-", self._get_fcf()],
+            "現在価値に割り引いたFCF": lambda: "",
+            "    ": lambda: "",
+            "資本効率": lambda: "",
+            "投下資本": lambda: ["", self._get_invested_capital()],
+            "税引き後営業利益率": lambda: [calculate_percentage(x, y) for x, y in zip(nopats(), revenues())],
+            "投下資本回転率": lambda: ["-", calculate_percentage(revenues()[1], self._get_invested_capital())],
+            "ROIC": lambda: ["-", calculate_percentage(nopats()[1], self._get_invested_capital())],
+            "         ": lambda: "",
+            "予測レシオ": lambda: "",
+            "売上原価：売上原価/売上高": lambda: [calculate_percentage(self._get_cost_of_sales()[1], revenues()[1])],
+            "販売費及び一般管理費：販売費及び一般管理費/売上高": lambda: [
+                calculate_percentage(self._get_selling_general_and_administrative_expenses()[1], revenues()[1])
             ],
-            "販売費及び一般管理費：販売費及び一般管理費/売上高": [
-                calculate_str_ratio(
-                    self._get_float_values_by_name("^販売費及び一般管理費$", ["当期"], True)[0],
-                    financial_summary["revenues"][1],
-                ),
+            "減価償却費：減価償却費(t)/正味有形固定資産(t-1)": lambda: [
+                calculate_percentage(self._get_deprecations()[1], self._get_net_trading_fixed_assets()[0])
             ],
-            "減価償却費：減価償却費(t)/正味有形固定資産(t-1)": [
-                calculate_str_ratio(financial_summary["deprecations"][1], net_trading_fixed_assets[0]),
+            "売掛金：売掛金/売上高": lambda: [
+                calculate_percentage(self.get_net_operating_capital()["sum_of_sales_receivables"][1], revenues()[1])
             ],
-            "売掛金：売掛金/売上高": [
-                calculate_str_ratio(
-                    net_working_capital["sum_of_sales_receivables"][1],
-                    financial_summary["revenues"][1],
-                ),
+            "棚卸資産：棚卸資産/売上原価": lambda: [
+                calculate_percentage(
+                    self.get_net_operating_capital()["sum_of_inventories"][1], self._get_cost_of_sales()[1]
+                )
             ],
-            "棚卸資産：棚卸資産/売上原価": [
-                calculate_str_ratio(
-                    net_working_capital["sum_of_inventories"][1],
-                    financial_summary["cost_of_sales"][1],
-                ),
+            "買掛金: 買掛金/売上高": lambda: [
+                calculate_percentage(self.get_net_operating_capital()["sum_of_purchase_debt"][1], revenues()[1])
             ],
-            "買掛金: 買掛金/売上高": [
-                calculate_str_ratio(
-                    net_working_capital["sum_of_purchase_debt"][1],
-                    financial_summary["revenues"][1],
-                ),
-            ],
-            "正味有形固定資産（有形固定資産-累計減価償却費）": net_trading_fixed_assets,
-            "正味有形固定資産：正味有形固定資産/売上高": [
-                calculate_str_ratio(
-                    net_trading_fixed_assets[1],
-                    financial_summary["revenues"][1],
-                ),
+            "正味有形固定資産（有形固定資産-累計減価償却費）": self._get_net_trading_fixed_assets,
+            "正味有形固定資産：正味有形固定資産/売上高": lambda: [
+                calculate_percentage(self._get_net_trading_fixed_assets()[1], revenues()[1])
             ],
             # "有形固定資産回転率": [
-            #     calculate_str_ratio(x, y) for x, y in zip(financial_summary["revenues"], tangible_fixed_assets)
+            #     calculate_percentage(x, y) for x, y in zip(financial_summary["revenues"], tangible_fixed_assets)
             # ],
-            # "未払費用 : 未払費用/売上高": calculate_ratio(
-            #     net_working_capital["未払費用"][1], financial_summary["revenues"][1]
-            # ),
-            # "未払金 : 未払金/売上高": calculate_ratio(
-            #     net_working_capital["未払金"][1], financial_summary["revenues"][1]
-            # ),
         }
 
+    @traced("financial_data.get_report")
+    def get_report(self, keys=None):
+        # keysを指定した場合は、その行(例: ["ROIC"])に必要な値のみを計算して返す
+        # consolidated_bs_title = "連結貸借対照表 [テキストブロック]"
+        # bs_title = "貸借対照表 [テキストブロック]"
+        # # 連結貸借対照表を探して、なければ単体貸借対照表を探す
+        # bs = self._get_first_value_by_name(consolidated_bs_title, ["当期"])
+        # if bs == "":
+        #     bs = self._get_first_value_by_name(bs_title, ["当期"])
+        #     # 見つからない場合はエラー
+        #     if bs == "":
+        #         raise Exception("貸借対照表が見つかりませんでした")
+        report_items = self._get_report_items()
+        if keys is None:
+            keys = report_items.keys()
+        return {key: report_items[key]() for key in keys}
+
+    @_memoized
+    @traced("financial_data.calc_interest_bearing_debt")
     def calc_interest_bearing_debt(self):
-        interest_bearing_debt_item_names = set(
-            self._get_item_name(x, "当期末")
-            for x in self.interest_bearing_debt_items
-            if self._get_item_name(x, "当期") != ""
-        )
-        interest_bearing_debt = {
-            item_name: self._get_float_values_by_name(item_name, ["前期末", "当期末"])
-            for item_name in interest_bearing_debt_item_names
-        }
+        interest_bearing_debt = dict(self.get_interest_bearing_debt())
         interest_bearing_debt["sum_of_interest_bearing_debt"] = [
             sum(value[i] for value in interest_bearing_debt.values()) for i in range(2)
         ]
         return interest_bearing_debt
 
+    def _get_net_operating_capital_item(self, key: str):
+        return self.get_net_operating_capital()[key]
+
+    @_memoized
+    @traced("financial_data.get_net_operating_capital")
     def get_net_operating_capital(self) -> NetOperatingCapital:
-        # 重複項目が発生するため、項目名からsetを取得
-        sales_receivables_item_names = set(
-            [
-                self._get_item_name(x, "当期")
-                for x in self.sales_receivables_items
-                if self._get_item_name(x, "当期") != ""
-            ]
-        )
-        inventories_item_names = set(
-            [self._get_item_name(x, "当期") for x in self.inventories_items if self._get_item_name(x, "当期") != ""]
-        )
-        purchase_debt_item_names = set(
-            [self._get_item_name(x, "当期") for x in self.purchase_debt_items if self._get_item_name(x, "当期") != ""]
-        )
-        sales_receivables = {
-            item_name: self._get_float_values_by_name(item_name, ["前期", "当期"])
-            for item_name in sales_receivables_item_names
-        }
-        inventories = {
-            item_name: self._get_float_values_by_name(item_name, ["前期", "当期"])
-            for item_name in inventories_item_names
-        }
-        purchase_debt = {
-            item_name: self._get_float_values_by_name(item_name, ["前期", "当期"])
-            for item_name in purchase_debt_item_names
-        }
+        # 当期の値がある項目のみを合計する
+        terms = self.terms["balance"]
+        sales_receivables = self._get_sums_of_items(self.sales_receivables_items, terms[1], terms)
+        inventories = self._get_sums_of_items(self.inventories_items, terms[1], terms)
+        purchase_debt = self._get_sums_of_items(self.purchase_debt_items, terms[1], terms)
         sum_of_sales_receivables = [sum(values[i] for values in sales_receivables.values()) for i in range(2)]
         sum_of_inventories = [sum(values[i] for values in inventories.values()) for i in range(2)]
         sum_of_purchase_debt = [sum(values[i] for values in purchase_debt.values()) * -1 for i in range(2)]
@@ -314,84 +370,46 @@ class FinancialDataProcessor:
         }
         return net_operating_capital
 
+    @_memoized
+    @traced("financial_data.get_idle_assets")
     def get_idle_assets(self):
         return {
-            "投資有価証券": self._get_float_values_by_name("投資有価証券", ["前期", "当期"]),
-            "現金及び預金": self._get_float_values_by_name("現金及び預金", ["前期", "当期"]),
+            "投資有価証券": self._get_float_values("investment_securities", self.terms["balance"]),
+            "現金及び預金": self._get_float_values("cash_and_deposits", self.terms["balance"]),
         }
 
-    def get_financial_summary(self) -> FinancialSummary:
-        operating_profits = self._get_float_values_by_name("営業利益又は営業損失（△）", ["前期", "当期"])
-        effective_tax_rates = [
-            calculate_ratio(x, y)
-            for x, y in zip(
-                self._get_float_values_by_name(r"^法人税等", ["前期", "当期"], True),
-                self._get_float_values_by_name("税引前当期純利益又は税引前当期純損失（△）", ["前期", "当期"]),
-            )
-        ]
-        effective_tax_rates_str = [
-            calculate_str_ratio(x, y)
-            for x, y in zip(
-                self._get_float_values_by_name(r"^法人税等", ["前期", "当期"], True),
-                self._get_float_values_by_name("税引前当期純利益又は税引前当期純損失（△）", ["前期", "当期"]),
-            )
-        ]
+    def _get_financial_summary_item(self, key: str):
+        revenues = self._get_revenues
+        items = {
+            "revenues": revenues,
+            "revenue_growth_rate": lambda: ["-", calculate_growth_ratio(revenues()[0], revenues()[1])],
+            "cost_of_sales": self._get_cost_of_sales,
+            "売上総利益": self._get_gross_profit,
+            "売上総利益率": lambda: [calculate_percentage(x, y) for x, y in zip(self._get_gross_profit(), revenues())],
+            "selling_general_and_administrative_expenses": self._get_selling_general_and_administrative_expenses,
+            "operating_profits": self._get_operating_profits,
+            "営業利益率": lambda: [
+                calculate_percentage(x, y) for x, y in zip(self._get_operating_profits(), revenues())
+            ],
+            "実効税率": lambda: [calculate_percentage(x, y) for x, y in self._get_effective_tax_rates()],
+            "nopat": self._get_nopats,
+            "deprecations": self._get_deprecations,
+            "capital_expenditure": lambda: ["-"] + self._get_capital_expenditure(),
+        }
+        return items[key]()
 
-        nopats = [x * (1 - y) for x, y in zip(operating_profits, effective_tax_rates)]
-        revenues = self._get_float_values_by_name("売上高", ["前期", "当期"])
-        # "売上原価
-        cost_of_sales = self._get_float_values_by_name("売上原価", ["前期", "当期"])
-        # 一般管理費及び販売費
-        selling_general_and_administrative_expenses = self._get_float_values_by_name(
-            "販売費及び一般管理費", ["前期", "当期"]
-        )
+    @_memoized
+    @traced("financial_data.get_financial_summary")
+    def get_financial_summary(self) -> FinancialSummary:
         # 純利益
         # net_income = self._get_float_values_by_name(
         #     r"^当期純利益又は当期純損失（△）（.*改正後）",
         #     ["前期", "当期"],
         #     True,
         # )
-        # net_incomeがすべて０の場合、別の項目名で検索
-        # if net_income[0] == 0 and net_income[1] == 0:
-        #     net_income = self._get_float_values_by_name(
-        #         r"^当期純利益又は当期純損失（△）",
-        #         ["前期", "当期"],
-        #         True,
-        #     )
-
-        # # 潜在株式調整後１株当たり当期純利益
-        # net_income_per_share_adjusted_for_potential_stock: list[float] = self._get_float_values_by_name(
-        #     "潜在株式調整後1株当たり当期純利益",[ "前期", "当期"]
-        # )
-        # # 潜在株式がない場合
-        # if len(net_income_per_share_adjusted_for_potential_stock) == 0:
-        #     net_income_per_share_adjusted_for_potential_stock = self._get_float_values_by_name(
-        #         "１株当たり当期純利益又は当期純損失（△）",[ "前期", "当期"]
-        #     )
         # # 総資産
         # total_assets = self._get_float_values_by_name("総資産額", ["前期", "当期"])
-        # 売上総利益を定義
-        gross_profit = [x - y for x, y in zip(revenues, cost_of_sales)]
-
-        return {
-            "revenues": revenues,
-            "revenue_growth_rate": [
-                "-",
-                calculate_growth_ratio(revenues[0], revenues[1]),
-            ],
-            "cost_of_sales": cost_of_sales,
-            "売上総利益": gross_profit,
-            "売上総利益率": [calculate_str_ratio(x, y) for x, y in zip(gross_profit, revenues)],
-            "selling_general_and_administrative_expenses": selling_general_and_administrative_expenses,
-            "operating_profits": operating_profits,
-            "営業利益率": [calculate_str_ratio(x, y) for x, y in zip(operating_profits, revenues)],
-            "実効税率": effective_tax_rates_str,
-            "nopat": nopats,
-            # "net_income": net_income,
-            "deprecations": self._get_float_values_by_name(
-                "減価償却費、営業活動によるキャッシュ・フロー", ["前期", "当期"]
-            ),
-            "capital_expenditure": ["-"] + self._get_float_values_by_name("設備投資額、設備投資等の概要", ["当期"]),
-            # "net_income_per_share_adjusted_for_potential_stock": net_income_per_share_adjusted_for_potential_stock,
-            # "total_assets": total_assets,
-        }
+        financial_summary = cast(
+            FinancialSummary, {key: self._get_financial_summary_item(key) for key in FINANCIAL_SUMMARY_KEYS}
+        )
+        return financial_summary
@@ -0,0 +1,57 @@
+import functools
+import json
+import os
+import re
+from collections.abc import Callable
+
+# 指標(key) → 候補の項目名・要素IDの定義。EDINET_ITEM_MAPPING_PATHで別のファイルを指定できる
+ITEM_MAPPING_PATH = os.getenv(
+    "EDINET_ITEM_MAPPING_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "item_mapping.json")
+)
+# 正規表現の結果をキャッシュする項目名の数(会社独自の項目名もあるため上限を設ける)
+ITEM_NAME_CACHE_SIZE = 65536
+
+
+class ItemMapping:
+    # 定義を、項目名・要素IDから指標(key)を引く表にまとめる
+    # items: key → {"names": 完全一致する項目名, "element_ids": 要素ID,
+    #               "match": 先頭一致(re.match)する正規表現, "search": 部分一致(re.search)する正規表現}
+    # groups: 合計する指標のまとまり(売上債権など) → keyのリスト
+    def __init__(self, definition: dict):
+        self.items: dict[str, dict] = definition["items"]
+        self.groups: dict[str, tuple[str, ...]] = {name: tuple(keys) for name, keys in definition["groups"].items()}
+        for name, keys in self.groups.items():
+            assert all(key in self.items for key in keys), f"{name}に未定義の項目があります"
+        self._names: dict[str, list[str]] = {}
+        self._element_ids: dict[str, list[str]] = {}
+        self._patterns: list[tuple[Callable, str]] = []
+        for key, item in self.items.items():
+            for name in item.get("names", []):
+                self._names.setdefault(name, []).append(key)
+            for element_id in item.get("element_ids", []):
+                self._element_ids.setdefault(element_id, []).append(key)
+            self._patterns += [(re.compile(pattern).match, key) for pattern in item.get("match", [])]
+            self._patterns += [(re.compile(pattern).search, key) for pattern in item.get("search", [])]
+        # 項目名 → (完全一致したkey, 正規表現に一致したkey)のキャッシュ。書類が変わっても同じ項目名には同じ結果を使う
+        # 要素IDは辞書を引くだけのため、キャッシュしない(会社独自の要素IDでキャッシュが増え続けないように)
+        self._resolve_name = functools.lru_cache(maxsize=ITEM_NAME_CACHE_SIZE)(self._match_name)
+
+    def _match_name(self, item_name: str) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        keys = tuple(key for matches, key in self._patterns if matches(item_name))
+        return tuple(self._names.get(item_name, [])), keys
+
+    def resolve(self, item_name, element_id=None) -> tuple[str, ...]:
+        # 項目名・要素IDが該当する指標(key)を返す。正規表現は同じ項目名につき一度だけ評価する
+        if not isinstance(item_name, str):
+            return ()
+        name_keys, pattern_keys = self._resolve_name(item_name)
+        element_keys = self._element_ids.get(element_id, []) if isinstance(element_id, str) else []
+        return tuple(dict.fromkeys([*name_keys, *element_keys, *pattern_keys]))
+
+
+def load_item_mapping(path=ITEM_MAPPING_PATH) -> ItemMapping:
+    with open(path, encoding="utf-8") as file:
+        return ItemMapping(json.load(file))
+
+
+item_mapping = load_item_mapping()
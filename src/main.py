@@ -1,27 +1,27 @@
 import os
-import re
 import zipfile
 from datetime import datetime
 
 import pandas as pd
 import questionary
 
-from fetch import fetch_annual_report_by_docid, fetch_doc_list
-from file_utils import PREPROCESSED_CSV_HEADER, export_df_to_csv, save_doc_from_zip
-from financial_data import FinancialDataProcessor
-from preprocess import preprocess_csv
+from crawler import ANNUAL_REPORT_SUBMISSION_MONTHS, crawl_doc_lists, find_filings
+from fetch import fetch_annual_report_by_docid, fetch_doc_list, metrics
+from file_utils import INTERMEDIATE_FORMAT
+from pipeline import run_pipeline
+from report import generate_report_from_zip, get_doc_period, get_save_dir_and_title
+from tracing import tracer
 from type import ReportType
-from utils import input_date, input_sec_code, sanitize_filename
+from utils import input_date, input_sec_code
 
 
-def search_annual_report_by_date_and_seccode(
-    start_date: str, report_type: ReportType, secCode: str
-) -> pd.DataFrame:
+def search_annual_report_by_date_and_seccode(start_date: str, report_type: ReportType, secCode: str) -> pd.DataFrame:
+    # 有価証券報告書に限らず、report_typeの書類(四半期報告書、半期報告書など)を探す
     result = fetch_doc_list(start_date)
     assert "results" in result
     df = pd.DataFrame(result["results"])
     df_filtered = df[df["secCode"].notna()]
-    report_type = str(ReportType.ANNUAL_SECURITIES_REPORT.value)
+    report_type = str(ReportType(report_type).value)
     # print(df_filtered["secCode"].unique())
     df_filtered = df_filtered.query(
         "docTypeCode == @report_type and secCode == @secCode",
@@ -30,42 +30,63 @@ def search_annual_report_by_date_and_seccode(
     return df_filtered
 
 
-def fetch_and_save_annual_report(df: pd.DataFrame) -> str:
-    filerName = sanitize_filename(df["filerName"].values[0])
-    docDescription = sanitize_filename(df["docDescription"].values[0])
-    sec_code = df["secCode"].values[0]
+# 1. 日付と証券コードから、企業の業績データを取得する
+def generate_report_from_single_report(
+    date: str, sec_code: str, report_type: ReportType = ReportType.ANNUAL_SECURITIES_REPORT
+):
+    start_date = str(datetime.strptime(date, "%Y%m%d"))
+    df = search_annual_report_by_date_and_seccode(start_date, report_type, sec_code)
+    df.head()
+    save_dir, title = get_save_dir_and_title(df)
     selected_doc_id = df["docID"].values[0]
-    dates = re.findall(r"\d{8}", docDescription)
-    end_year = dates[1][:4]
-    title = f"{filerName}_{docDescription}.csv"
     zip_file = fetch_annual_report_by_docid(selected_doc_id)
-    if zip_file is None:
-        print(f"docID: {selected_doc_id} のファイルのダウンロードに失敗しました。")
-        exit(1)
+    year = start_date[:4]
     try:
-        return save_doc_from_zip(zip_file, os.path.join(sec_code, end_year), title)
+        generate_report_from_zip(
+            zip_file, save_dir, title, year, sec_code=sec_code, doc_id=selected_doc_id, period=get_doc_period(df)
+        )
     except zipfile.BadZipFile:
         print(f"docID: {selected_doc_id} のファイルはZIPファイルではありません。")
         exit(1)
 
 
-# 1. 日付と証券コードから、企業の業績データを取得する
-def generate_report_from_single_report(date: str, sec_code: str):
-    start_date = str(datetime.strptime(date, "%Y%m%d"))
-    df = search_annual_report_by_date_and_seccode(start_date, 120, sec_code)
-    df.head()
-    saved_path = fetch_and_save_annual_report(df)
-    preprocessed_path = preprocess_csv(saved_path)
-    preprocess_df = pd.read_csv(preprocessed_path, encoding="utf-8")
-    year = start_date[:4]
-    result = FinancialDataProcessor(preprocess_df, year).get_report()
-    save_path = preprocessed_path.replace(PREPROCESSED_CSV_HEADER, "")
-    export_df_to_csv(result, save_path)
-
-
-# 過去10年分のデータを取得する(今日から数えて)
-# 日付は多少前後するので、指定した日付で見つからない場合は、±1の日付で検索し続ける
-# 全部取得したら、それぞれのデータを結合して、csvに保存する。
+# 2. 複数の証券コードと年度の範囲から、企業の業績データをまとめて取得する
+# 書類一覧をcrawler.pyで取得・索引化し、期末日の年がstart_year〜end_yearの有価証券報告書を処理する
+# リクエストの頻度はfetch.pyのrate_limiterで全スレッド共通に制御される
+def generate_reports(
+    sec_codes: list[str],
+    start_year: int,
+    end_year: int,
+    max_workers=4,
+    intermediate_format=INTERMEDIATE_FORMAT,
+    process_workers=None,
+    report_types=(ReportType.ANNUAL_SECURITIES_REPORT,),
+) -> list[str]:
+    # ダウンロードはmax_workers個のスレッド、レポートの作成はprocess_workers個のプロセスで並行して行う
+    # report_typesに四半期報告書・半期報告書を含めると、期末日がstart_year〜end_yearのそれらの書類も処理する
+    end_date = f"{end_year + 1}-{ANNUAL_REPORT_SUBMISSION_MONTHS:02d}-30"
+    crawl_doc_lists(f"{start_year}-01-01", end_date, max_workers)
+    years = range(start_year, end_year + 1)
+    doc_type_codes = [ReportType(report_type).value for report_type in report_types]
+    docs = pd.concat(
+        [
+            find_filings(sec_code, doc_type_codes=doc_type_codes, fiscal_year=year)
+            for sec_code in sec_codes
+            for year in years
+        ],
+        ignore_index=True,
+    )
+    print(f"{len(docs)}件の報告書が見つかりました。")
+    save_paths = []
+    for doc_id, result in run_pipeline(docs, max_workers, process_workers, intermediate_format=intermediate_format):
+        if isinstance(result, Exception):
+            print(f"docID: {doc_id} の処理に失敗しました。{result!r}")
+        else:
+            save_paths.append(result)
+    print(f"EDINET APIへのリクエスト: {metrics.summary()}")
+    # 段階ごとの時間(プロセスプールで処理した分も含む)
+    tracer.print_summary()
+    return save_paths
 
 
 if __name__ == "__main__":
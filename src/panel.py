@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from calculate import (
+    calculate_growth_ratio,
+    calculate_percentage,
+    calculate_ratio,
+    calculate_weighted_average_cost,
+)
+from item_mapping import item_mapping
+from period import PERIODS
+from preprocess import NUMERIC_COLUMN, parse_values
+from tracing import traced
+
+# 提出書類を識別する列(既定は証券コードと年度)
+FILING_KEYS = ["secCode", "year"]
+
+
+def concat_filings(filings: list[tuple[str, int, pd.DataFrame]], keys=FILING_KEYS) -> pd.DataFrame:
+    # (識別子, 年, 前処理済みのデータ)のリストを、FinancialPanelProcessorに渡す縦持ちのデータにまとめる
+    # 識別子・年はkeysの列(既定はsecCode, year)に入れる
+    frames = [
+        df.reindex(columns=["要素ID", "項目名", "相対年度", "連結・個別", "値", NUMERIC_COLUMN]).assign(
+            **{keys[0]: identifier, keys[1]: int(year)}
+        )
+        for identifier, year, df in filings
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+class FinancialPanelProcessor:
+    # 複数企業・複数年度の前処理済みデータをまとめて受け取り、指標を列ごとに一括で計算する
+    # df: keysの列(既定はsecCode, year)と 要素ID, 項目名, 相対年度, 連結・個別, 値, 数値 の列を持つ縦持ちのデータ
+    #     同じ書類の行の順番は、FinancialDataProcessorに渡すデータと同じ順番とする
+    # keys: 書類を識別する列。get_reportの結果はこの列をインデックスとする
+    # period: 期間の種類(period.PERIODS)。すべての書類に同じ期間の値(相対年度)を使う
+
+    def __init__(self, df: pd.DataFrame, keys=FILING_KEYS, period="annual"):
+        self.keys = list(keys)
+        self.period = period
+        self.terms = PERIODS[period]
+        df = df.reset_index(drop=True)
+        # 数値に変換していない古い前処理済みファイルの行は、ここでまとめて変換する
+        df = parse_values(df)
+        df = df.assign(
+            position=np.arange(len(df)),
+            priority=np.select(
+                [
+                    df["連結・個別"].str.contains("連結", regex=False).fillna(False).astype(bool),
+                    df["連結・個別"].str.contains("個別", regex=False).fillna(False).astype(bool),
+                ],
+                [0, 1],
+                2,
+            ),
+            相対年度=df["相対年度"].fillna("").astype(str),
+        )
+        # 要素IDのない古い前処理済みファイルは、項目名のみで引く
+        if "要素ID" not in df.columns:
+            df = df.assign(要素ID=None)
+        self.index = pd.MultiIndex.from_frame(df[self.keys].drop_duplicates())
+        # 項目名・要素IDから指標(key)を引く。同じ組み合わせは一度だけ引き、1つの行が複数の指標に使われることがある
+        pairs = df[["項目名", "要素ID"]].drop_duplicates()
+        pairs["key"] = [item_mapping.resolve(name, element_id) for name, element_id in pairs.itertuples(index=False)]
+        keyed = df.merge(pairs.explode("key").dropna(subset=["key"]), on=["項目名", "要素ID"], how="inner")
+        keyed = keyed.sort_values(["priority", "position"], kind="stable", ignore_index=True)
+        self.items = keyed[keyed["key"] != "accumulated_depreciation"]
+        self.accumulated_depreciations = keyed[keyed["key"] == "accumulated_depreciation"]
+        self._pivots: dict[str, tuple[pd.DataFrame, pd.DataFrame]] = {}
+
+    def _pivot(self, term: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+        # 相対年度にtermを含む行のうち、連結、個別、その他の順で最初に見つかった値を書類・項目ごとに取り出す
+        # (数値, テキスト)の組を返す。数値でない値、値のない行は数値がNaN
+        if term not in self._pivots:
+            items = self.items[self.items["相対年度"].str.contains(term, regex=False)]
+            items = items.drop_duplicates(self.keys + ["key"], keep="first")
+            self._pivots[term] = tuple(
+                items.pivot(index=self.keys, columns="key", values=column).reindex(self.index)
+                for column in (NUMERIC_COLUMN, "値")
+            )
+        return self._pivots[term]
+
+    def _get(self, key: str, term: str) -> pd.Series:
+        numbers, _ = self._pivot(term)
+        if key not in numbers.columns:
+            return pd.Series(0.0, index=self.index)
+        return numbers[key].astype(float).fillna(0.0)
+
+    def _get_text(self, key: str, term: str) -> pd.Series:
+        _, texts = self._pivot(term)
+        if key not in texts.columns:
+            return pd.Series("", index=self.index)
+        return texts[key].fillna("").astype(str)
+
+    def _sum_items(self, items: tuple[str, ...], terms: tuple[str, str]) -> tuple[pd.Series, pd.Series]:
+        # FinancialDataProcessorと同じく、当期(terms[1])に存在する項目のみを合計する
+        numbers, texts = (pivot.reindex(columns=list(items)) for pivot in self._pivot(terms[1]))
+        exists = numbers.notna() | texts.notna()
+        previous = self._pivot(terms[0])[0].reindex(columns=list(items)).where(exists)
+        current = numbers.where(exists)
+        return previous.astype(float).sum(axis=1), current.astype(float).sum(axis=1)
+
+    def _sum_accumulated_depreciation(self, term: str) -> pd.Series:
+        rows = self.accumulated_depreciations
+        rows = rows[rows["相対年度"].str.contains(term, regex=False)]
+        sums = rows[NUMERIC_COLUMN].groupby([rows[key] for key in self.keys]).sum()
+        return sums.reindex(self.index, fill_value=0.0)
+
+    @traced("panel.get_report")
+    def get_report(self) -> pd.DataFrame:
+        # FinancialDataProcessorと同じく、期間の値はduration、貸借対照表の値はbalance、期末時点の値はinstantの相対年度を使う
+        duration, balance, instant = (self.terms[kind] for kind in ("duration", "balance", "instant"))
+        revenues = self._get("revenues", duration[1])
+        previous_revenues = self._get("revenues", duration[0])
+        cost_of_sales = self._get("cost_of_sales", duration[1])
+        sga = self._get("selling_general_and_administrative_expenses", duration[1])
+        operating_profits = [self._get("operating_profits", term) for term in duration]
+        # 実効税率は小数第2位で丸め、税引前利益が0の場合は0とする(FinancialDataProcessorと同じ)
+        nopats = []
+        for term, operating_profit in zip(duration, operating_profits):
+            taxes = self._get("income_taxes", term)
+            profit_before_tax = self._get("profit_before_tax", term)
+            tax_rates = calculate_ratio(taxes, profit_before_tax, 2).fillna(0.0)
+            nopats.append(operating_profit * (1 - tax_rates))
+        deprecations = self._get("deprecations", duration[1])
+        capital_expenditure = self._get("capital_expenditure", duration[1])
+
+        # 正味運転資本
+        sales_receivables = self._sum_items(item_mapping.groups["sales_receivables"], balance)
+        inventories = self._sum_items(item_mapping.groups["inventories"], balance)
+        purchase_debt = [-x for x in self._sum_items(item_mapping.groups["purchase_debt"], balance)]
+        net_operating_capitals = [x + y + z for x, y, z in zip(inventories, sales_receivables, purchase_debt)]
+        fluctuation_of_net_operating_capitals = net_operating_capitals[1] - net_operating_capitals[0]
+
+        # 有利子負債と投下資本
+        interest_bearing_debt = self._sum_items(item_mapping.groups["interest_bearing_debt"], instant)
+        shareholders_equity = [self._get("shareholders_equity", term) for term in balance]
+        invested_capital = (
+            interest_bearing_debt[0] + shareholders_equity[0] + interest_bearing_debt[1] + shareholders_equity[1]
+        ) / 2
+
+        # 正味有形固定資産(有形固定資産-累計減価償却費)
+        net_trading_fixed_assets = [
+            self._get("tangible_fixed_assets", term) - self._sum_accumulated_depreciation(instant_term)
+            for term, instant_term in zip(balance, instant)
+        ]
+
+        # 加重平均借入コストは書類ごとにテキストブロックを解析する
+        debt_details = self._get_text("consolidated_debt_detail", duration[1])
+        debt_details = debt_details.where(debt_details != "", self._get_text("debt_detail", duration[1]))
+
+        return pd.DataFrame(
+            {
+                "revenues": revenues,
+                "revenue_growth_rate": calculate_growth_ratio(previous_revenues, revenues),
+                "cost_of_sales": cost_of_sales,
+                "gross_profit": revenues - cost_of_sales,
+                "selling_general_and_administrative_expenses": sga,
+                "operating_profits": operating_profits[1],
+                "operating_profit_margin": calculate_percentage(operating_profits[1], revenues),
+                "nopat": nopats[1],
+                "deprecations": deprecations,
+                "capital_expenditure": capital_expenditure,
+                "sum_of_sales_receivables": sales_receivables[1],
+                "sum_of_inventories": inventories[1],
+                "sum_of_purchase_debt": purchase_debt[1],
+                "sum_of_net_operating_capitals": net_operating_capitals[1],
+                "fluctuation_of_net_operating_capitals": fluctuation_of_net_operating_capitals,
+                "sum_of_interest_bearing_debt": interest_bearing_debt[1],
+                "debt_rate": debt_details.map(calculate_weighted_average_cost).astype(float),
+                "shareholders_equity": shareholders_equity[1],
+                "number_of_stock": self._get("number_of_stock", instant[1])
+                - self._get("number_of_company_stock", instant[1]),
+                "investment_securities": self._get("investment_securities", balance[1]),
+                "cash_and_deposits": self._get("cash_and_deposits", balance[1]),
+                "fcf": nopats[1] - capital_expenditure + deprecations - fluctuation_of_net_operating_capitals,
+                "invested_capital": invested_capital,
+                "nopat_margin": calculate_percentage(nopats[1], revenues),
+                "invested_capital_turnover": calculate_percentage(revenues, invested_capital),
+                "roic": calculate_percentage(nopats[1], invested_capital),
+                # 予測レシオ
+                "cost_of_sales_ratio": calculate_percentage(cost_of_sales, revenues),
+                "sga_ratio": calculate_percentage(sga, revenues),
+                "deprecation_ratio": calculate_percentage(deprecations, net_trading_fixed_assets[0]),
+                "sales_receivables_ratio": calculate_percentage(sales_receivables[1], revenues),
+                "inventories_ratio": calculate_percentage(inventories[1], cost_of_sales),
+                "purchase_debt_ratio": calculate_percentage(purchase_debt[1], revenues),
+                "net_trading_fixed_assets": net_trading_fixed_assets[1],
+                "net_trading_fixed_assets_ratio": calculate_percentage(net_trading_fixed_assets[1], revenues),
+            },
+            index=self.index,
+        )
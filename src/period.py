@@ -0,0 +1,85 @@
+import re
+
+import pandas as pd
+
+from type import ReportType
+
+# 期間の種類 → 値を探す相対年度の(前, 当)の組。相対年度にこの文字列を含む値を使う
+# duration: 売上高など期間の値、instant: 有利子負債など期末時点の値
+# balance: 貸借対照表の値(有価証券報告書では"前期"・"当期"で"前期末"・"当期末"にも一致させてきたため分けている)
+PERIODS = {
+    # 有価証券報告書(通期)
+    "annual": {
+        "duration": ("前期", "当期"),
+        "balance": ("前期", "当期"),
+        "instant": ("前期末", "当期末"),
+    },
+    # 半期報告書(中間期)。期末時点の前は前事業年度末
+    "half": {
+        "duration": ("前中間期", "当中間期"),
+        "balance": ("前期末", "当中間期末"),
+        "instant": ("前期末", "当中間期末"),
+    },
+    # 四半期報告書の期首からの累計(第2四半期なら6か月分)
+    "cumulative": {
+        "duration": ("前年度同四半期累計期間", "当四半期累計期間"),
+        "balance": ("前期末", "当四半期会計期間末"),
+        "instant": ("前期末", "当四半期会計期間末"),
+    },
+    # 四半期報告書の3か月間のみ(記載しない会社も多い)
+    "quarter": {
+        "duration": ("前年度同四半期会計期間", "当四半期会計期間"),
+        "balance": ("前期末", "当四半期会計期間末"),
+        "instant": ("前期末", "当四半期会計期間末"),
+    },
+}
+# 前処理で残す相対年度(いずれかの期間の種類で使うもの)
+TERM_REGEX = "|".join(
+    sorted({re.escape(term) for terms in PERIODS.values() for pair in terms.values() for term in pair})
+)
+# 書類の種類 → 期間の種類(訂正報告書は元の報告書と同じ)
+DOC_TYPE_PERIODS = {
+    ReportType.ANNUAL_SECURITIES_REPORT.value: "annual",
+    ReportType.AMENDED_ANNUAL_SECURITIES_REPORT.value: "annual",
+    ReportType.QUARTERLY_REPORT.value: "cumulative",
+    ReportType.AMENDED_QUARTERLY_REPORT.value: "cumulative",
+    ReportType.SEMI_ANNUAL_REPORT.value: "half",
+    ReportType.AMENDED_SEMI_ANNUAL_REPORT.value: "half",
+}
+# DEI(書類の基本情報)の要素ID。前処理では相対年度によらず残す
+DEI_PREFIX = "jpdei_cor:"
+DEI_PERIOD_TYPE = "jpdei_cor:TypeOfCurrentPeriodDEI"
+DEI_FISCAL_YEAR_END = "jpdei_cor:CurrentFiscalYearEndDateDEI"
+DEI_SEC_CODE = "jpdei_cor:SecurityCodeDEI"
+# 当会計期間の種類(DEI) → 期間の種類。四半期報告書は期首からの累計を使う
+PERIOD_TYPES = {"FY": "annual", "HY": "half", "Q1": "cumulative", "Q2": "cumulative", "Q3": "cumulative"}
+# 通期の当会計期間の種類。DEIのない書類(古い前処理済みファイルなど)は通期とみなす
+ANNUAL_PERIOD_TYPE = "FY"
+
+
+def get_period(doc_type_code) -> str | None:
+    # 書類一覧のdocTypeCodeから期間の種類を決める。対象外の書類の場合はNone(DEIから判定する)
+    if doc_type_code is None or pd.isna(doc_type_code):
+        return None
+    return DOC_TYPE_PERIODS.get(int(doc_type_code))
+
+
+def get_dei_value(df: pd.DataFrame, element_id: str) -> str | None:
+    if "要素ID" not in df.columns:
+        return None
+    values = df.loc[df["要素ID"] == element_id, "値"].dropna()
+    return str(values.iloc[0]) if len(values) > 0 else None
+
+
+def get_period_type(df: pd.DataFrame) -> str:
+    # "FY"(通期)、"HY"(中間期)、"Q1"〜"Q3"(四半期)
+    period_type = get_dei_value(df, DEI_PERIOD_TYPE)
+    return period_type if period_type in PERIOD_TYPES else ANNUAL_PERIOD_TYPE
+
+
+def get_fiscal_year(df: pd.DataFrame, default: int) -> int:
+    # 事業年度の末日の年。四半期・中間期の書類も、属する事業年度の年にする
+    fiscal_year_end = get_dei_value(df, DEI_FISCAL_YEAR_END)
+    if fiscal_year_end is None or not fiscal_year_end[:4].isdigit():
+        return int(default)
+    return int(fiscal_year_end[:4])
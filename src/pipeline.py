@@ -0,0 +1,122 @@
+import os
+import queue
+import sys
+import threading
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from fetch import fetch_annual_report_by_docid
+from file_utils import INTERMEDIATE_FORMAT
+from report import generate_report_from_doc_zip
+from tracing import tracer
+
+# 1つのプロセスにまとめて渡す書類の数
+CHUNK_SIZE = 4
+# ダウンロード済みで、処理待ちのZIPを保持する数の上限(メモリ使用量を抑えるため)
+QUEUE_SIZE = 32
+# 1つのプロセスで処理するタスク数。超えた場合はプロセスを作り直す(メモリの断片化を防ぐため)
+# Python 3.11以降のみ。3.10ではプロセスを作り直さない
+MAX_TASKS_PER_CHILD = 100
+_DONE = object()
+
+
+def create_process_pool(max_workers=None) -> ProcessPoolExecutor:
+    if sys.version_info >= (3, 11):
+        return ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=MAX_TASKS_PER_CHILD)
+    return ProcessPoolExecutor(max_workers=max_workers)
+
+
+def _process_chunk(
+    chunk: list[tuple[int, pd.DataFrame, bytes]], intermediate_format: str
+) -> tuple[list[tuple[int, object]], dict[str, dict]]:
+    # プロセスプールで実行する。失敗した書類は例外を結果として返し、他の書類の処理を続ける
+    # 子プロセスで計測した段階ごとの時間も返し、親プロセスのtracerに集める
+    tracer.reset()
+    results: list[tuple[int, object]] = []
+    for index, df, zip_file in chunk:
+        try:
+            results.append((index, generate_report_from_doc_zip(df, zip_file, intermediate_format)))
+        except Exception as e:
+            results.append((index, e))
+    return results, tracer.snapshot()
+
+
+def _download(docs: pd.DataFrame, download_workers: int, downloaded: queue.Queue):
+    # ダウンロードしたZIPをキューに入れる。キューが一杯の場合はダウンロードを止めて待つ
+    def download(index: int):
+        try:
+            downloaded.put((index, fetch_annual_report_by_docid(docs["docID"][index])))
+        except Exception as e:
+            downloaded.put((index, e))
+
+    with ThreadPoolExecutor(max_workers=download_workers) as executor:
+        list(executor.map(download, range(len(docs))))
+    downloaded.put(_DONE)
+
+
+def run_pipeline(
+    docs: pd.DataFrame,
+    download_workers=4,
+    process_workers=None,
+    chunk_size=CHUNK_SIZE,
+    queue_size=QUEUE_SIZE,
+    ordered=False,
+    intermediate_format=INTERMEDIATE_FORMAT,
+) -> Iterator[tuple[str, object]]:
+    # docs(書類一覧)の書類をダウンロードし、プロセスプールでレポートを作成する
+    # ダウンロード(I/O)はスレッド、レポートの作成(CPU)はプロセスで行い、間を上限付きのキューでつなぐ
+    # (docID, 保存先のパス or 例外)を、ordered=Trueの場合はdocsの順に、Falseの場合は終わった順に返す
+    docs = docs.reset_index(drop=True)
+    process_workers = process_workers or os.cpu_count() or 1
+    downloaded: queue.Queue = queue.Queue(maxsize=queue_size)
+    downloader = threading.Thread(target=_download, args=(docs, download_workers, downloaded), daemon=True)
+    downloader.start()
+
+    results: dict[int, object] = {}
+    next_index = 0
+
+    def collect(futures: set[Future]) -> Iterator[tuple[str, object]]:
+        # 終わったチャンクの結果を返す。ordered=Trueの場合は、docsの順に返せる分だけ返す
+        nonlocal next_index
+        done, _ = wait(futures, return_when=FIRST_COMPLETED) if futures else (set(), set())
+        for future in done:
+            futures.remove(future)
+            chunk_results, stages = future.result()
+            tracer.merge(stages)
+            for index, result in chunk_results:
+                if ordered:
+                    results[index] = result
+                else:
+                    yield docs["docID"][index], result
+        while ordered and next_index in results:
+            yield docs["docID"][next_index], results.pop(next_index)
+            next_index += 1
+
+    with create_process_pool(process_workers) as executor:
+        futures: set[Future] = set()
+        chunk: list[tuple[int, pd.DataFrame, bytes]] = []
+        while True:
+            item = downloaded.get()
+            if item is not _DONE:
+                index, zip_file = item
+                if isinstance(zip_file, Exception):
+                    if ordered:
+                        results[index] = zip_file
+                    else:
+                        yield docs["docID"][index], zip_file
+                else:
+                    chunk.append((index, docs.iloc[[index]], zip_file))
+            if len(chunk) >= chunk_size or (item is _DONE and len(chunk) > 0):
+                futures.add(executor.submit(_process_chunk, chunk, intermediate_format))
+                chunk = []
+            # 処理中のチャンクが多すぎる場合は、終わるまで待つ(キューが詰まり、ダウンロードも止まる)
+            while len(futures) >= process_workers * 2:
+                yield from collect(futures)
+            if item is _DONE:
+                break
+        while len(futures) > 0:
+            yield from collect(futures)
+        # ダウンロードに失敗した書類だけが残っている場合
+        yield from collect(futures)
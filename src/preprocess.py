@@ -1,16 +1,57 @@
 import pandas as pd
 
-from file_utils import PREPROCESSED_CSV_HEADER, ROW_CSV_HEADER
+from file_utils import (
+    PREPROCESSED_CSV_HEADER,
+    ROW_CSV_HEADER,
+    read_doc_chunks_from_zip,
+    read_intermediate,
+    write_intermediate,
+)
+from period import DEI_PREFIX, TERM_REGEX
+from tracing import traced
+from utils import convert_values_to_float
 
-term_regex = r"当期末?|前期末?"
+# 有価証券報告書・四半期報告書・半期報告書で使う相対年度(当期、当期末、当四半期累計期間など)
+term_regex = TERM_REGEX
+PREPROCESS_COLUMNS = ["要素ID", "項目名", "相対年度", "連結・個別", "値"]
+# 残すテキストブロック(FinancialDataProcessorで使うもの)。それ以外のテキストブロックは大きいため削除する
+TEXT_BLOCK_ITEMS = ("借入金等明細表", "設備投資等の概要")
+# 値を数値に変換した列。数値に変換できた行は、値の列を空にする(テキストの値のみ文字列で持つ)
+NUMERIC_COLUMN = "数値"
+# preprocess_zipで一度に読み込む行数
+PREPROCESS_CHUNK_SIZE = 20000
 
 
-def remove_unnecessary_columns(df) -> pd.DataFrame:
-    # dfから要素ID、コンテキストID,ユニットID列を削除
+def filter_rows(df) -> pd.DataFrame:
+    # dfからコンテキストID,ユニットID列などを削除(要素IDはitem_mappingで使うため残す)
     # 相対年度の列が、項目が空の行は削除
-    df = df[["項目名", "相対年度", "連結・個別", "値"]].dropna(subset=["項目名"])
+    df = df[PREPROCESS_COLUMNS].dropna(subset=["項目名"])
     # 相対年度の列が、terms_regexに一致する行のみを抽出、ただし、項目名が”設備投資等の概要 [テキストブロック]”は残す
-    df = df[df["相対年度"].str.contains(term_regex) | (df["項目名"] == "設備投資等の概要 [テキストブロック]")]
+    # DEI(当会計期間の種類、事業年度の末日など)は書類の期間を判定するため残す
+    df = df[
+        df["相対年度"].str.contains(term_regex, na=False)
+        | (df["項目名"] == "設備投資等の概要 [テキストブロック]")
+        | df["要素ID"].str.startswith(DEI_PREFIX, na=False)
+    ]
+    # テキストブロックは、TEXT_BLOCK_ITEMSから始まるもののみ残す
+    text_block = df["項目名"].str.contains("[テキストブロック]", regex=False)
+    return df[~text_block | df["項目名"].str.startswith(TEXT_BLOCK_ITEMS)]
+
+
+@traced("preprocess")
+def remove_unnecessary_columns(df) -> pd.DataFrame:
+    return _merge_items(filter_rows(df))
+
+
+@traced("parse_csv_and_preprocess")
+def preprocess_zip(zip_data: bytes, chunksize=PREPROCESS_CHUNK_SIZE) -> pd.DataFrame:
+    # ZIP内のCSVから必要な列だけをchunksize行ずつ読み込み、読み込んだ分から絞り込む
+    # remove_unnecessary_columns(read_doc_from_zip(zip_data))と同じ結果を、少ないメモリで返す
+    chunks = [filter_rows(chunk) for chunk in read_doc_chunks_from_zip(zip_data, PREPROCESS_COLUMNS, chunksize)]
+    return _merge_items(pd.concat(chunks))
+
+
+def _merge_items(df) -> pd.DataFrame:
     # 項目名の列内の"、経営指標等"のを削除
     # 総資産額、経営指標等　→　総資産額
     df["項目名"] = df["項目名"].str.replace("、経営指標等", "")
@@ -22,20 +63,30 @@ def remove_unnecessary_columns(df) -> pd.DataFrame:
     # start_index = df[df["項目名"].str.startswith("所有株式数", na=False)].index[0]
     # end_index = df[df["項目名"] == "現金及び預金"].index[0] - 1
     # df = df.drop(df.index[start_index:end_index])
+    return parse_values(df)
+
+
+def parse_values(df) -> pd.DataFrame:
+    # 値の列をまとめて数値に変換し、NUMERIC_COLUMNに入れる(△付きの負の数、"－"、","、全角の数字も変換する)
+    # DEI(証券コードなど)は数字のみでも文字列として扱う。変換済みの行はそのまま残す
+    numbers = convert_values_to_float(df["値"])
+    if "要素ID" in df.columns:
+        numbers = numbers.where(~df["要素ID"].astype("string").str.startswith(DEI_PREFIX).fillna(False).astype(bool))
+    if NUMERIC_COLUMN in df.columns:
+        numbers = df[NUMERIC_COLUMN].astype("float64").fillna(numbers)
+    df[NUMERIC_COLUMN] = numbers
+    df["値"] = df["値"].where(numbers.isna())
     return df
 
 
 def preprocess_csv(saved_path: str):
     # saved_path: 前処理前のcsvファイルのパス
     # 	例：	/Users/alucard/edinetapi/EDINET/row_csv/62550/株式会社エヌ・ピー・シー_有価証券報告書－第31期20220901－20230831.csv
-    df = pd.read_csv(saved_path)
+    # csvの他、parquet, featherで保存されたファイルも読み込める。保存は同じ形式で行う
+    df = read_intermediate(saved_path)
     df = remove_unnecessary_columns(df)
     # 保存するpathはrow_csvフォルダのパスからprocessed_csvフォルダのパスに変更
     preprocessed_path = saved_path.replace(ROW_CSV_HEADER, PREPROCESSED_CSV_HEADER)
-    # 前処理済みのcsvファイルを保存
-    df.to_csv(
-        preprocessed_path,
-        index=False,
-        encoding="utf-8",
-    )
+    # 前処理済みのファイルを保存
+    write_intermediate(df, preprocessed_path)
     return preprocessed_path
@@ -0,0 +1,85 @@
+import os
+import re
+
+import pandas as pd
+
+from file_utils import (
+    BASE_PATH,
+    INTERMEDIATE_FORMAT,
+    PREPROCESSED_CSV_HEADER,
+    ROW_CSV_HEADER,
+    export_df_to_csv,
+    read_doc_from_zip,
+    save_intermediate,
+)
+from financial_data import FinancialDataProcessor
+from period import get_period
+from preprocess import preprocess_zip, remove_unnecessary_columns
+from result_store import save_report
+from tracing import profile_filing
+from utils import sanitize_filename
+
+
+def get_save_dir_and_title(df: pd.DataFrame) -> tuple[str, str]:
+    filerName = sanitize_filename(df["filerName"].values[0])
+    docDescription = sanitize_filename(df["docDescription"].values[0])
+    sec_code = df["secCode"].values[0]
+    dates = re.findall(r"\d{8}", docDescription)
+    end_year = dates[1][:4]
+    title = f"{filerName}_{docDescription}.csv"
+    return os.path.join(sec_code, end_year), title
+
+
+def generate_report_from_zip(
+    zip_file: bytes,
+    save_dir: str,
+    title: str,
+    year: str,
+    intermediate_format=INTERMEDIATE_FORMAT,
+    sec_code: str | None = None,
+    doc_id: str | None = None,
+    period: str | None = None,
+) -> str:
+    # ZIPの読み込みから前処理、レポート作成までをメモリ上で行い、途中経過は保存のみ行う
+    # sec_codeを指定した場合は、指標を数値のままresult_storeにも保存する
+    # period: 期間の種類(period.PERIODS)。書類一覧のdocTypeCodeからget_periodで決める。Noneの場合はDEIから判定する
+    # intermediate_formatが"none"の場合、途中経過は保存せず、必要な列・行だけを少しずつ読み込む
+    if intermediate_format == "none":
+        preprocess_df = preprocess_zip(zip_file)
+    else:
+        row_df = read_doc_from_zip(zip_file)
+        save_intermediate(row_df, save_dir, ROW_CSV_HEADER, title, intermediate_format)
+        preprocess_df = remove_unnecessary_columns(row_df)
+    save_intermediate(preprocess_df, save_dir, PREPROCESSED_CSV_HEADER, title, intermediate_format)
+    processor = FinancialDataProcessor(preprocess_df, year, doc_id, period)
+    result = processor.get_report()
+    if sec_code is not None:
+        # 四半期・中間期の値と並べられるよう、事業年度と当会計期間の種類(FY, Q1など)で保存する
+        save_report(sec_code, processor.fiscal_year, result, doc_id, processor.period_type)
+    save_path = os.path.join(BASE_PATH, save_dir, title)
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    export_df_to_csv(result, save_path)
+    return save_path
+
+
+def get_doc_period(df: pd.DataFrame) -> str | None:
+    # 書類一覧の1行(df)の書類の種類から、期間の種類を決める
+    return get_period(df["docTypeCode"].values[0]) if "docTypeCode" in df.columns else None
+
+
+def generate_report_from_doc_zip(df: pd.DataFrame, zip_file: bytes, intermediate_format=INTERMEDIATE_FORMAT) -> str:
+    # 書類一覧の1行(df)とダウンロード済みのZIPからレポートを作成する
+    save_dir, title = get_save_dir_and_title(df)
+    year = df["submitDateTime"].values[0][:4]
+    # EDINET_PROFILEが指定されている場合は、書類ごとにプロファイルを保存する
+    with profile_filing(df["docID"].values[0]):
+        return generate_report_from_zip(
+            zip_file,
+            save_dir,
+            title,
+            year,
+            intermediate_format,
+            df["secCode"].values[0],
+            df["docID"].values[0],
+            get_doc_period(df),
+        )
@@ -0,0 +1,178 @@
+import math
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from cache import _connect
+from calculate import calculate_ttm
+from file_utils import BASE_PATH
+from period import ANNUAL_PERIOD_TYPE
+
+# 作成したレポートの指標を数値のまま保存するデータベース(CSVは表示用)
+RESULT_DB_PATH = os.path.join(BASE_PATH, "results.sqlite3")
+# 数値でない行(見出し、空行)は保存しない
+SKIPPED_METRICS = ("年",)
+
+
+def _migrate_result_db():
+    # period列のない古いデータベースは、すべて通期(FY)の値として新しい形式に移す
+    if not os.path.exists(RESULT_DB_PATH):
+        return
+    with closing(sqlite3.connect(RESULT_DB_PATH, timeout=30)) as connection, connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(metrics)")]
+        if len(columns) == 0 or "period" in columns:
+            return
+        connection.execute("ALTER TABLE metrics RENAME TO metrics_without_period")
+        connection.execute("DROP INDEX IF EXISTS metrics_metric")
+        connection.execute("DROP INDEX IF EXISTS metrics_docID")
+        connection.executescript(RESULT_DB_SCHEMA)
+        connection.execute(
+            "INSERT INTO metrics SELECT secCode, year, ?, metric, value, docID, saved_at FROM metrics_without_period",
+            (ANNUAL_PERIOD_TYPE,),
+        )
+        connection.execute("DROP TABLE metrics_without_period")
+
+
+# periodは当会計期間の種類("FY", "HY", "Q1"〜"Q3")。四半期・中間期の値は期首からの累計
+RESULT_DB_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS metrics (
+        secCode TEXT NOT NULL, year INTEGER NOT NULL, period TEXT NOT NULL, metric TEXT NOT NULL,
+        value REAL NOT NULL, docID TEXT, saved_at REAL NOT NULL,
+        PRIMARY KEY (secCode, year, period, metric)
+    );
+    CREATE INDEX IF NOT EXISTS metrics_metric ON metrics (metric, period, year, value);
+    CREATE INDEX IF NOT EXISTS metrics_docID ON metrics (docID);
+    """
+_migrated = False
+
+
+def _connect_result_db():
+    global _migrated
+    if not _migrated:
+        _migrate_result_db()
+        _migrated = True
+    return _connect(RESULT_DB_PATH, RESULT_DB_SCHEMA)
+
+
+def _to_float(value) -> float | None:
+    # 数値、"12.3%"(%の値として12.3)、数値の文字列を変換する。"-"や空文字、NaN(分母が0の比率など)はNone
+    if isinstance(value, (int, float)):
+        return None if math.isnan(value) else float(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip().replace(",", "")
+    if value.endswith("%"):
+        value = value[:-1]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def report_to_records(report: dict) -> dict[str, float]:
+    # FinancialDataProcessor.get_reportの結果から、当期の値を 指標 → 数値 で取り出す
+    # [前期, 当期]のリストは当期(最後)の値、入れ子の辞書は"指標/項目"とする
+    records = {}
+    for key, values in report.items():
+        if key in SKIPPED_METRICS:
+            continue
+        items = values.items() if isinstance(values, dict) else [(None, values)]
+        for subkey, value in items:
+            if isinstance(value, (list, tuple)):
+                value = value[-1] if len(value) > 0 else None
+            number = _to_float(value)
+            if number is not None:
+                records[key if subkey is None else f"{key}/{subkey}"] = number
+    return records
+
+
+def save_report(sec_code: str, year: int, report: dict, doc_id: str | None = None, period: str = ANNUAL_PERIOD_TYPE):
+    # 同じ証券コード・年度・期間のレポートは置き換える(訂正報告書で上書きする場合など)
+    records = report_to_records(report)
+    saved_at = time.time()
+    with _connect_result_db() as connection:
+        connection.execute(
+            "DELETE FROM metrics WHERE secCode = ? AND year = ? AND period = ?", (sec_code, int(year), period)
+        )
+        connection.executemany(
+            "INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(sec_code, int(year), period, metric, value, doc_id, saved_at) for metric, value in records.items()],
+        )
+
+
+def load_metrics(sec_codes=None, metrics=None, start_year=None, end_year=None, periods=None) -> pd.DataFrame:
+    # secCode, year, period, metric, value, docIDの縦持ちのデータで返す
+    conditions = []
+    parameters: list = []
+    for column, values in (("secCode", sec_codes), ("metric", metrics), ("period", periods)):
+        if values is not None:
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            parameters.extend(values)
+    if start_year is not None:
+        conditions.append("year >= ?")
+        parameters.append(int(start_year))
+    if end_year is not None:
+        conditions.append("year <= ?")
+        parameters.append(int(end_year))
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    with _connect_result_db() as connection:
+        rows = connection.execute(
+            f"SELECT secCode, year, period, metric, value, docID FROM metrics{where} "
+            "ORDER BY secCode, year, period, metric",
+            parameters,
+        ).fetchall()
+    return pd.DataFrame([tuple(row) for row in rows], columns=["secCode", "year", "period", "metric", "value", "docID"])
+
+
+def load_ttm(sec_code: str, metric: str, year: int, period: str) -> float | None:
+    # 直近12か月(直近4四半期の合計)の値。売上高など期間の指標のみ意味がある
+    # 当年度の累計 + 前年度の通期 - 前年度の同じ期間の累計 で計算し、必要な値がない場合はNone
+    if period == ANNUAL_PERIOD_TYPE:
+        df = load_metrics([sec_code], [metric], year, year, [ANNUAL_PERIOD_TYPE])
+        return float(df["value"].iloc[0]) if len(df) > 0 else None
+    df = load_metrics([sec_code], [metric], year - 1, year, [ANNUAL_PERIOD_TYPE, period])
+    values = {(row.year, row.period): row.value for row in df.itertuples()}
+    keys = [(year - 1, ANNUAL_PERIOD_TYPE), (year, period), (year - 1, period)]
+    if any(key not in values for key in keys):
+        return None
+    return calculate_ttm(*(values[key] for key in keys))
+
+
+def screen(
+    metric: str, greater_than=None, less_than=None, years=1, end_year=None, period=ANNUAL_PERIOD_TYPE
+) -> list[str]:
+    # end_yearまでの直近years年のすべてでmetricが範囲内の証券コードを返す(既定では通期の値で判定する)
+    # 例: ROICが5年連続で10%超 → screen("ROIC", greater_than=10, years=5)
+    with _connect_result_db() as connection:
+        if end_year is None:
+            end_year = connection.execute(
+                "SELECT MAX(year) FROM metrics WHERE metric = ? AND period = ?", (metric, period)
+            ).fetchone()[0]
+            if end_year is None:
+                return []
+        conditions = ["metric = ?", "period = ?", "year > ?", "year <= ?"]
+        parameters: list = [metric, period, int(end_year) - years, int(end_year)]
+        if greater_than is not None:
+            conditions.append("value > ?")
+            parameters.append(greater_than)
+        if less_than is not None:
+            conditions.append("value < ?")
+            parameters.append(less_than)
+        rows = connection.execute(
+            f"SELECT secCode FROM metrics WHERE {' AND '.join(conditions)} "
+            "GROUP BY secCode HAVING COUNT(DISTINCT year) = ? ORDER BY secCode",
+            parameters + [years],
+        ).fetchall()
+    return [row["secCode"] for row in rows]
+
+
+def export_metrics_to_parquet(save_path: str, **conditions):
+    # 分析用に、load_metricsの結果を行が(証券コード, 年度, 期間)、列が指標の表にしてParquetで保存する
+    df = load_metrics(**conditions)
+    table = df.pivot(index=["secCode", "year", "period"], columns="metric", values="value").reset_index()
+    table.columns.name = None
+    table.to_parquet(save_path, index=False)
+    return save_path
@@ -0,0 +1,169 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date as Date
+from datetime import timedelta
+
+import pandas as pd
+
+from cache import edinet_today
+from crawler import crawl_doc_lists, get_dates
+from fetch import fetch_annual_report_by_docid, fetch_doc_list, metrics
+from file_utils import BASE_PATH, INTERMEDIATE_FORMAT
+from report import generate_report_from_zip, get_doc_period, get_save_dir_and_title
+from tracing import profile_filing, tracer
+from type import ReportType
+from utils import normalize_sec_code
+
+SYNC_STATE_PATH = os.path.join(BASE_PATH, "sync_state.json")
+# 同期の対象とする書類の種類。訂正報告書は元の書類(parentDocID)のレポートを置き換える
+# 四半期報告書・半期報告書も同期し、年度の途中でも指標を更新する
+SYNC_REPORT_TYPES = (
+    ReportType.ANNUAL_SECURITIES_REPORT.value,
+    ReportType.AMENDED_ANNUAL_SECURITIES_REPORT.value,
+    ReportType.QUARTERLY_REPORT.value,
+    ReportType.AMENDED_QUARTERLY_REPORT.value,
+    ReportType.SEMI_ANNUAL_REPORT.value,
+    ReportType.AMENDED_SEMI_ANNUAL_REPORT.value,
+)
+AMENDED_REPORT_TYPES = tuple(
+    str(report_type.value)
+    for report_type in (
+        ReportType.AMENDED_ANNUAL_SECURITIES_REPORT,
+        ReportType.AMENDED_QUARTERLY_REPORT,
+        ReportType.AMENDED_SEMI_ANNUAL_REPORT,
+    )
+)
+# 初回の同期で遡る日数
+INITIAL_SYNC_DAYS = 7
+
+
+def load_sync_state() -> dict:
+    # last_date: 同期が完了した最後の日付(この日までの書類一覧は変更されない)
+    # reports: 処理済みのdocID → {"save_dir", "title", "path"}
+    if not os.path.exists(SYNC_STATE_PATH):
+        return {"last_date": None, "reports": {}}
+    with open(SYNC_STATE_PATH, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_sync_state(state: dict):
+    # 書き込み途中で止まっても壊れないよう、一時ファイルに書いてから置き換える
+    temporary_path = SYNC_STATE_PATH + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, SYNC_STATE_PATH)
+
+
+def get_new_documents(
+    state: dict, dates: list[str], report_types=SYNC_REPORT_TYPES, sec_codes=None
+) -> tuple[pd.DataFrame, list[str]]:
+    # 書類一覧から、未処理で対象の種類の書類を提出順に取り出す
+    # (書類, 書類一覧を取得できなかった日付)を返す。取得できなかった日は書類がない日として扱わない
+    report_types = [str(report_type) for report_type in report_types]
+    results = []
+    failed_dates = []
+    for date in dates:
+        try:
+            doc_list = fetch_doc_list(date)
+        except Exception as e:
+            doc_list = {"error": repr(e)}
+        if "results" not in doc_list:
+            print(f"{date} の書類一覧の取得に失敗しました。{doc_list}")
+            failed_dates.append(date)
+            continue
+        results.extend(doc_list["results"])
+    docs = pd.DataFrame(results)
+    if len(docs) == 0:
+        return docs, failed_dates
+    docs = docs[docs["secCode"].notna() & docs["docTypeCode"].isin(report_types)]
+    # 取り下げられた書類、CSVのない書類は処理しない
+    if "withdrawalStatus" in docs.columns:
+        docs = docs[docs["withdrawalStatus"] != "1"]
+    if "csvFlag" in docs.columns:
+        docs = docs[docs["csvFlag"] == "1"]
+    if sec_codes is not None:
+        docs = docs[docs["secCode"].isin([normalize_sec_code(sec_code) for sec_code in sec_codes])]
+    docs = docs[~docs["docID"].isin(state["reports"].keys())]
+    return docs.sort_values(by="submitDateTime", ignore_index=True), failed_dates
+
+
+def process_document(df: pd.DataFrame, state: dict, intermediate_format=INTERMEDIATE_FORMAT) -> dict:
+    # 訂正報告書で元の書類が処理済みの場合は、元の書類と同じ保存先に上書きする
+    parent_doc_id = df["parentDocID"].values[0] if "parentDocID" in df.columns else None
+    parent = state["reports"].get(parent_doc_id) if df["docTypeCode"].values[0] in AMENDED_REPORT_TYPES else None
+    if parent is not None:
+        save_dir, title = parent["save_dir"], parent["title"]
+    else:
+        save_dir, title = get_save_dir_and_title(df)
+    zip_file = fetch_annual_report_by_docid(df["docID"].values[0])
+    year = df["submitDateTime"].values[0][:4]
+    with profile_filing(df["docID"].values[0]):
+        path = generate_report_from_zip(
+            zip_file,
+            save_dir,
+            title,
+            year,
+            intermediate_format,
+            df["secCode"].values[0],
+            df["docID"].values[0],
+            get_doc_period(df),
+        )
+    return {"save_dir": save_dir, "title": title, "path": path, "parentDocID": parent_doc_id}
+
+
+def sync_new_filings(
+    report_types=SYNC_REPORT_TYPES, sec_codes=None, max_workers=4, intermediate_format=INTERMEDIATE_FORMAT
+) -> list[str]:
+    # 前回の同期以降に提出された書類のみを取得し、レポートを作成する
+    state = load_sync_state()
+    today = edinet_today()
+    if state["last_date"] is None:
+        start_date = str(today - timedelta(days=INITIAL_SYNC_DAYS))
+    else:
+        start_date = str(Date.fromisoformat(state["last_date"]) + timedelta(days=1))
+    # 書類一覧の取得に失敗した日付は、次回の同期で取得し直す
+    failed_dates = crawl_doc_lists(start_date, str(today), max_workers)
+    dates = [date for date in get_dates(start_date, str(today)) if date not in failed_dates]
+    docs, unavailable_dates = get_new_documents(state, dates, report_types, sec_codes)
+    failed_dates = sorted(failed_dates + unavailable_dates)
+    print(f"{len(docs)}件の新しい書類が見つかりました。")
+    save_paths = []
+    failed = False
+    # 訂正報告書が元の書類の保存先を参照できるよう、元の書類を先に処理する
+    batches = []
+    if len(docs) > 0:
+        amended = docs["docTypeCode"].isin(AMENDED_REPORT_TYPES)
+        batches = [docs[~amended].reset_index(drop=True), docs[amended].reset_index(drop=True)]
+    for batch in batches:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_document, batch.iloc[[i]], state, intermediate_format): batch["docID"][i]
+                for i in range(len(batch))
+            }
+            for future in as_completed(futures):
+                try:
+                    report = future.result()
+                except Exception as e:
+                    failed = True
+                    print(f"docID: {futures[future]} の処理に失敗しました。{e!r}")
+                    continue
+                state["reports"][futures[future]] = report
+                save_paths.append(report["path"])
+                save_sync_state(state)
+    # 失敗した書類がなければ、昨日までを同期済みとする(当日分は提出が続くため次回も確認する)
+    # 書類一覧の取得に失敗した日付がある場合は、その前日までとする
+    if not failed:
+        last_date = today - timedelta(days=1)
+        if len(failed_dates) > 0:
+            last_date = min(last_date, Date.fromisoformat(failed_dates[0]) - timedelta(days=1))
+        state["last_date"] = str(last_date)
+    save_sync_state(state)
+    print(f"EDINET APIへのリクエスト: {metrics.summary()}")
+    tracer.print_summary()
+    return save_paths
+
+
+if __name__ == "__main__":
+    assert os.getenv("KEY")
+    sync_new_filings()
@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+
+from crawler import find_filings
+from fetch import fetch_annual_report_by_docid
+from file_utils import BASE_PATH, export_time_series_to_csv
+from panel import FinancialPanelProcessor, concat_filings
+from preprocess import preprocess_zip
+
+# 計算済みの年度の指標を保存するファイル(証券コードごと)
+TIME_SERIES_STORE_NAME = "time_series.csv"
+TIME_SERIES_REPORT_NAME = "time_series_report.csv"
+
+
+def get_time_series_store_path(sec_code: str) -> str:
+    return os.path.join(BASE_PATH, sec_code, TIME_SERIES_STORE_NAME)
+
+
+def load_time_series(sec_code: str) -> pd.DataFrame:
+    path = get_time_series_store_path(sec_code)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["docID", "secCode", "year", "submitDateTime"])
+    return pd.read_csv(path, encoding="utf-8", dtype={"docID": str, "secCode": str})
+
+
+def update_time_series(sec_code: str, docs: pd.DataFrame | None = None, rebuild=False) -> pd.DataFrame:
+    # 有価証券報告書を年度順につなげた時系列の指標を作成する
+    # 計算済みの年度(docID)は保存したものを使い、新しい書類のみを処理する
+    # docs: docID, periodEnd, submitDateTimeの列を持つ書類一覧。省略した場合はキャッシュ済みの書類一覧から探す
+    # rebuild: Trueの場合、計算済みの年度も再計算する(FinancialPanelProcessorの計算を変更した場合など)
+    if docs is None:
+        docs = find_filings(sec_code)
+    store = load_time_series(sec_code)
+    if rebuild:
+        store = store.iloc[0:0]
+    new_docs = docs[~docs["docID"].isin(store["docID"])]
+    if len(new_docs) > 0:
+        filings = []
+        for _, doc in new_docs.iterrows():
+            zip_file = fetch_annual_report_by_docid(doc["docID"])
+            df = preprocess_zip(zip_file)
+            # 年度は期末日の年とする
+            filings.append((doc["docID"], int(doc["periodEnd"][:4]), df))
+        # docIDごとに一括で計算する
+        keys = ["docID", "year"]
+        report = FinancialPanelProcessor(concat_filings(filings, keys), keys).get_report().reset_index()
+        report = report.assign(secCode=sec_code)
+        submit_dates = new_docs.set_index("docID")["submitDateTime"]
+        report["submitDateTime"] = report["docID"].map(submit_dates)
+        store = pd.concat([store, report], ignore_index=True)
+    store = store.sort_values(by=["year", "submitDateTime"], ignore_index=True)
+    path = get_time_series_store_path(sec_code)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    store.to_csv(path, index=False, encoding="utf-8")
+    return store
+
+
+def get_time_series_report(store: pd.DataFrame, years=10) -> pd.DataFrame:
+    # 直近years年分を、行が指標、列が年度の表にする
+    # 同じ年度の書類が複数ある場合は、後に提出されたものを使う
+    store = store.sort_values(by=["year", "submitDateTime"]).drop_duplicates(subset=["year"], keep="last")
+    store = store.tail(years)
+    metrics = store.drop(columns=["docID", "secCode", "submitDateTime"], errors="ignore").set_index("year")
+    return metrics.T
+
+
+def generate_time_series_report(sec_code: str, years=10, docs: pd.DataFrame | None = None) -> str:
+    store = update_time_series(sec_code, docs)
+    save_path = os.path.join(BASE_PATH, sec_code, TIME_SERIES_REPORT_NAME)
+    export_time_series_to_csv(get_time_series_report(store, years), save_path)
+    return save_path
@@ -0,0 +1,140 @@
+import cProfile
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# 段階ごとの時間・回数の計測。EDINET_TRACE=0の場合は計測しない
+TRACE_ENABLED = os.getenv("EDINET_TRACE", "1") != "0"
+# 書類ごとのプロファイル。"cprofile"の場合は.profファイル、"tracemalloc"の場合はメモリ使用量の上位を保存する
+PROFILE = os.getenv("EDINET_PROFILE", "")
+PROFILES = ("", "cprofile", "tracemalloc")
+PROFILE_PATH = os.getenv("EDINET_PROFILE_PATH", "./EDINET/profiles")
+# tracemalloc で保存する、メモリ使用量の多い行の数
+TRACEMALLOC_TOP = 20
+# cProfile・tracemallocはプロセス全体で1つのため、スレッドで並行して処理する場合もプロファイルは1件ずつ行う
+_profile_lock = threading.Lock()
+
+
+class StageTracer:
+    # 段階(stage)ごとの回数、合計・最大時間、扱ったバイト数を集計する(全スレッド共通)
+    # プロセスプールで処理した分は、snapshotで取り出してmergeで親プロセスに集める
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, dict] = {}
+
+    def record(self, stage: str, elapsed: float, size=0):
+        with self._lock:
+            stats = self._stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            stats["bytes"] += size
+
+    @contextmanager
+    def stage(self, name: str, size=0):
+        # 扱ったバイト数が後でわかる場合は、返すdictの"bytes"に設定する
+        span = {"bytes": size}
+        if not TRACE_ENABLED:
+            yield span
+            return
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.record(name, time.perf_counter() - start, span["bytes"])
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self._stages.items()}
+
+    def merge(self, snapshot: dict[str, dict]):
+        with self._lock:
+            for stage, other in snapshot.items():
+                stats = self._stages.setdefault(stage, {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+                stats["count"] += other["count"]
+                stats["total"] += other["total"]
+                stats["max"] = max(stats["max"], other["max"])
+                stats["bytes"] += other["bytes"]
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def summary(self) -> dict[str, dict]:
+        # 合計時間の長い順に、平均時間を加えて返す
+        snapshot = self.snapshot()
+        for stats in snapshot.values():
+            stats["mean"] = stats["total"] / stats["count"]
+        return dict(sorted(snapshot.items(), key=lambda item: item[1]["total"], reverse=True))
+
+    def print_summary(self):
+        summary = self.summary()
+        if len(summary) == 0:
+            return
+        print(f"{'stage':<48}{'count':>7}{'total(s)':>10}{'mean(ms)':>10}{'max(ms)':>10}{'MB':>9}")
+        for stage, stats in summary.items():
+            print(
+                f"{stage:<48}{stats['count']:>7}{stats['total']:>10.2f}{stats['mean'] * 1000:>10.2f}"
+                f"{stats['max'] * 1000:>10.2f}{stats['bytes'] / 2**20:>9.2f}"
+            )
+
+
+tracer = StageTracer()
+
+
+def traced(stage: str):
+    # 関数の実行時間をstageとして計測するデコレーター
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.stage(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profile_filing(doc_id: str, profile=PROFILE):
+    # 1つの書類の処理をプロファイルし、PROFILE_PATH/{docID}.prof(.txt)に保存する
+    # 他のスレッドのプロファイル中は待つ(ダウンロードなど、プロファイルしない処理は並行して進む)
+    assert profile in PROFILES
+    if profile == "":
+        yield
+        return
+    os.makedirs(PROFILE_PATH, exist_ok=True)
+    with _profile_lock:
+        with _profile(doc_id, profile):
+            yield
+
+
+@contextmanager
+def _profile(doc_id: str, profile: str):
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(PROFILE_PATH, f"{doc_id}.prof"))
+        return
+    # 既に計測中の場合(呼び出し元で計測している場合など)はそのまま使う
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        peak = tracemalloc.get_traced_memory()[1]
+        statistics = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+        if started:
+            tracemalloc.stop()
+        with open(os.path.join(PROFILE_PATH, f"{doc_id}.tracemalloc.txt"), "w", encoding="utf-8") as file:
+            file.write(f"peak: {peak} bytes\n")
+            file.writelines(f"{statistic}\n" for statistic in statistics)
@@ -82,6 +82,36 @@ class ReportType(Enum):
     AMENDED_LARGE_HOLDING_REPORT = 360
 
 
+# %で表す指標(FinancialDataProcessor.get_reportの行、FinancialPanelProcessor.get_reportの列)
+# 値は数値のまま持ち、出力時に"12.34%"の形式にする
+percentage_keys = {
+    "revenue_growth_rate",
+    "売上総利益率",
+    "営業利益率",
+    "実効税率",
+    "税引き後営業利益率",
+    "投下資本回転率",
+    "ROIC",
+    "売上原価：売上原価/売上高",
+    "販売費及び一般管理費：販売費及び一般管理費/売上高",
+    "減価償却費：減価償却費(t)/正味有形固定資産(t-1)",
+    "売掛金：売掛金/売上高",
+    "棚卸資産：棚卸資産/売上原価",
+    "買掛金: 買掛金/売上高",
+    "正味有形固定資産：正味有形固定資産/売上高",
+    "operating_profit_margin",
+    "nopat_margin",
+    "invested_capital_turnover",
+    "roic",
+    "cost_of_sales_ratio",
+    "sga_ratio",
+    "deprecation_ratio",
+    "sales_receivables_ratio",
+    "inventories_ratio",
+    "purchase_debt_ratio",
+    "net_trading_fixed_assets_ratio",
+}
+
 japanese_dict = {
     "revenues": "売上高",
     "operating_profits": "営業利益",
@@ -128,4 +158,23 @@ japanese_dict = {
     "net_income": "純利益",
     "total_assets": "総資産",
     "net_income_per_share_adjusted_for_potential_stock": "潜在株式調整後一株当たり純利益",
+    "gross_profit": "売上総利益",
+    "debt_rate": "債権者コスト",
+    "shareholders_equity": "株主資本",
+    "number_of_stock": "株式数(自社株控除後)",
+    "investment_securities": "投資有価証券",
+    "cash_and_deposits": "現金及び預金",
+    "fcf": "FCF",
+    "invested_capital": "投下資本",
+    "nopat_margin": "税引き後営業利益率",
+    "invested_capital_turnover": "投下資本回転率",
+    "roic": "ROIC",
+    "cost_of_sales_ratio": "売上原価：売上原価/売上高",
+    "sga_ratio": "販売費及び一般管理費：販売費及び一般管理費/売上高",
+    "deprecation_ratio": "減価償却費：減価償却費(t)/正味有形固定資産(t-1)",
+    "sales_receivables_ratio": "売掛金：売掛金/売上高",
+    "inventories_ratio": "棚卸資産：棚卸資産/売上原価",
+    "purchase_debt_ratio": "買掛金: 買掛金/売上高",
+    "net_trading_fixed_assets": "正味有形固定資産（有形固定資産-累計減価償却費）",
+    "net_trading_fixed_assets_ratio": "正味有形固定資産：正味有形固定資産/売上高",
 }
@@ -1,12 +1,24 @@
+import logging
 import re
 
+import pandas as pd
+
+# 負の数を表す記号(△100 → -100)
+NEGATIVE_SIGNS = "△▲"
+
 
 def sanitize_filename(name):
-    print(name)
+    logging.debug(name)
     # OSで禁止されている文字とパス区切り文字をアンダースコアに置き換える
     return re.sub(r'[\/:*?"<>|\(\)]+', "", name)
 
 
+def normalize_sec_code(sec_code: str) -> str:
+    # 証券コードは5桁(末尾0)に揃える
+    sec_code = str(sec_code)
+    return sec_code + "0" if len(sec_code) == 4 else sec_code
+
+
 def input_date():
     while True:
         date = input("検索する日付を入力してください(yyyymmdd): ")
@@ -33,6 +45,9 @@ def convert_to_thousand_separated(number: float | str) -> str:
     # 数値が文字列の場合、そのまま返す
     if isinstance(number, str):
         return number
+    # 値がない場合(分母が0の比率など)
+    if pd.isna(number):
+        return "-"
 
     # 数値をフォーマットして返す
     if isinstance(number, (int, float)):
@@ -46,10 +61,24 @@ def convert_to_thousand_separated(number: float | str) -> str:
     return "{:,.2f}".format(number)
 
 
-def convert_str_to_float(value: str) -> float:
-    if value == "－":
-        return 0
-    # △が頭についている場合、マイナスに変換
-    if "△" in str(value):
-        return -float(str(value).replace("△", ""))
-    return float(value)
+def format_percentage(number: float | str, decimal=2) -> str:
+    # calculate_percentageなどで計算した%の値を"12.34%"の形式にする
+    if isinstance(number, str):
+        return number
+    if pd.isna(number):
+        return "-"
+    return str(round(float(number), decimal)) + "%"
+
+
+def convert_values_to_float(values: pd.Series) -> pd.Series:
+    # 値の文字列を列全体に対してまとめて数値にする。数値として読めない値(テキストなど)はNaN
+    # 全角の数字・記号は半角にし、","は除き、"△"・"▲"が頭についている場合はマイナス、"－"のみの場合は0とする
+    strings = values.astype("string").str.normalize("NFKC").str.strip().str.replace(",", "", regex=False)
+    negative = strings.str.startswith(tuple(NEGATIVE_SIGNS)).fillna(False).astype(bool)
+    strings = strings.str.lstrip(NEGATIVE_SIGNS)
+    dash = strings.str.fullmatch(r"[-‐―—]+").fillna(False).astype(bool)
+    # pd.to_numericは"inf"、"nan"、"1e3"なども数値にするため、数字と小数点のみの値に限る
+    number = strings.str.fullmatch(r"-?\d+(?:\.\d+)?").fillna(False).astype(bool)
+    strings = strings.where(number, "0").where(number | dash)
+    numbers = pd.to_numeric(strings, errors="coerce").astype("float64")
+    return numbers.where(~negative, -numbers)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# src内のモジュールは from calculate import ... のように読み込むため、srcをパスに追加する
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+# cacheなどは読み込み時に ./EDINET/ を作成するため、一時ディレクトリで実行する
+os.chdir(tempfile.mkdtemp())
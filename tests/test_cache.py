@@ -0,0 +1,51 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+import cache
+
+
+def _make_zip(name: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as file:
+        file.writestr(f"{name}.csv", name * 100)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def zip_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "ZIP_CACHE_PATH", str(tmp_path))
+    monkeypatch.setattr(cache, "ZIP_CACHE_DB_PATH", str(tmp_path / "zip.sqlite3"))
+    monkeypatch.setattr(cache, "ZIP_CACHE_MAX_BYTES", 100)
+    return tmp_path
+
+
+def _save_zip_file(doc_id: str) -> str | None:
+    zip_data = _make_zip(doc_id)
+    temporary_path = cache.create_zip_temporary_file()
+    with open(temporary_path, "wb") as file:
+        file.write(zip_data)
+    return cache.save_zip_file(doc_id, temporary_path, hashlib.sha256(zip_data).hexdigest())
+
+
+def test_save_zip_file_keeps_new_zip_over_limit(zip_cache):
+    path = _save_zip_file("S100A")
+    assert path is not None and os.path.exists(path)
+    assert cache.load_zip_path("S100A") == path
+
+
+def test_save_zip_file_evicts_older_zips(zip_cache):
+    first = _save_zip_file("S100A")
+    second = _save_zip_file("S100B")
+    assert first is not None and not os.path.exists(first)
+    assert cache.load_zip("S100A") is None
+    assert second is not None and os.path.exists(second)
+    assert cache.load_zip("S100B") == _make_zip("S100B")
+
+
+def test_save_zip_keeps_new_zip_over_limit(zip_cache):
+    cache.save_zip("S100A", _make_zip("S100A"))
+    assert cache.load_zip("S100A") == _make_zip("S100A")
@@ -0,0 +1,34 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from calculate import calculate_growth_ratio, calculate_percentage, calculate_ratio
+
+
+def test_scalar():
+    assert calculate_ratio(1.0, 4.0) == 0.25
+    assert calculate_percentage(1.0, 4.0) == 25.0
+    assert calculate_growth_ratio(4.0, 5.0) == 25.0
+    assert math.isnan(calculate_ratio(1.0, 0.0))
+    assert math.isnan(calculate_growth_ratio(0.0, 5.0))
+
+
+def test_series_and_scalar():
+    series = pd.Series([1.0, 2.0], index=["a", "b"])
+    pd.testing.assert_series_equal(calculate_ratio(series, 4.0), pd.Series([0.25, 0.5], index=["a", "b"]))
+    pd.testing.assert_series_equal(calculate_ratio(4.0, series), pd.Series([4.0, 2.0], index=["a", "b"]))
+    pd.testing.assert_series_equal(calculate_growth_ratio(5.0, series), pd.Series([-80.0, -60.0], index=["a", "b"]))
+    pd.testing.assert_series_equal(calculate_growth_ratio(series, 3.0), pd.Series([200.0, 50.0], index=["a", "b"]))
+    assert calculate_ratio(series, 0.0).isna().all()
+
+
+def test_series_with_zero_denominator():
+    result = calculate_ratio(pd.Series([1.0, 2.0, 3.0]), pd.Series([2.0, 0.0, np.nan]), 2)
+    assert result.iloc[0] == 0.5
+    assert result.iloc[1:].isna().all()
+
+
+def test_array_and_scalar():
+    np.testing.assert_array_equal(calculate_percentage(np.array([1.0, 2.0]), 4.0), [25.0, 50.0])
+    np.testing.assert_array_equal(calculate_ratio(np.array([1.0, 2.0]), np.array([0.0, 4.0])), [np.nan, 0.5])
@@ -0,0 +1,57 @@
+from debt_table import parse_debt_table, weighted_average_rate
+
+HEADER = "区分 当期首残高 （百万円） 当期末残高 （百万円） 平均利率 （％） 返済期限"
+
+
+def test_whitespace_split_table():
+    text = (
+        f"【借入金等明細表】 {HEADER} "
+        "短期借入金 1,000 2,000 0.50 － "
+        "１年以内に返済予定の長期借入金 300 400 1.20 － "
+        "長期借入金（１年以内に返済予定のものを除く。） 5,000 6,000 1.50 2025年～2030年 "
+        "合計 6,300 8,400 － －"
+    )
+    table = parse_debt_table(text)
+    assert table["unit"] == 1_000_000
+    assert table["rows"] == [
+        {"区分": "短期借入金", "当期首残高": 1000.0, "当期末残高": 2000.0, "平均利率": 0.5},
+        {"区分": "1年以内に返済予定の長期借入金", "当期首残高": 300.0, "当期末残高": 400.0, "平均利率": 1.2},
+        {
+            "区分": "長期借入金(1年以内に返済予定のものを除く。)",
+            "当期首残高": 5000.0,
+            "当期末残高": 6000.0,
+            "平均利率": 1.5,
+        },
+        {"区分": "合計", "当期首残高": 6300.0, "当期末残高": 8400.0, "平均利率": None},
+    ]
+
+
+def test_label_with_leading_number_after_repayment_term():
+    text = f"{HEADER} 長期借入金 100 200 1.00 2026年 １年以内に返済予定のリース債務 10 20 2.00 －"
+    labels = [row["区分"] for row in parse_debt_table(text)["rows"]]
+    assert labels == ["長期借入金", "1年以内に返済予定のリース債務"]
+
+
+def test_html_table():
+    text = (
+        "<table><tr><td>区分</td><td>当期首残高<br/>(千円)</td><td>当期末残高<br/>(千円)</td>"
+        "<td>平均利率<br/>(%)</td><td>返済期限</td></tr>"
+        "<tr><td>短期借入金</td><td>1,000</td><td>3,000</td><td>1.00</td><td>&#8212;</td></tr>"
+        "<tr><td>１年以内に返済予定の長期借入金</td><td>－</td><td>1,000</td><td>3.00</td><td>－</td></tr>"
+        "</table>"
+    )
+    table = parse_debt_table(text)
+    assert table["unit"] == 1_000
+    assert table["rows"] == [
+        {"区分": "短期借入金", "当期首残高": 1000.0, "当期末残高": 3000.0, "平均利率": 1.0},
+        {"区分": "1年以内に返済予定の長期借入金", "当期首残高": None, "当期末残高": 1000.0, "平均利率": 3.0},
+    ]
+    assert weighted_average_rate(table) == 1.5
+
+
+def test_no_matching_rows():
+    assert parse_debt_table("該当事項はありません。")["rows"] == []
+    assert parse_debt_table("")["rows"] == []
+    table = parse_debt_table(f"{HEADER} 短期借入金 1,000")
+    assert table["rows"] == []
+    assert weighted_average_rate(table) == 0
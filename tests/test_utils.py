@@ -0,0 +1,26 @@
+import math
+
+import pandas as pd
+
+from utils import convert_values_to_float
+
+
+def _convert(values: list) -> list[float]:
+    return convert_values_to_float(pd.Series(values, dtype=object)).tolist()
+
+
+def test_negative_signs():
+    assert _convert(["△1,000", "▲25", "-3.5", "△１２３"]) == [-1000.0, -25.0, -3.5, -123.0]
+
+
+def test_full_width_digits():
+    assert _convert(["１２３", "１，２３４", "０．５"]) == [123.0, 1234.0, 0.5]
+
+
+def test_dashes_are_zero():
+    assert _convert(["－", "—", "-", "―"]) == [0.0, 0.0, 0.0, 0.0]
+
+
+def test_text_is_nan():
+    values = _convert(["inf", "nan", "1e3", "0x10", "該当事項はありません", "", None, "12円"])
+    assert all(math.isnan(value) for value in values)